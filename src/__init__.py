@@ -1,6 +1,9 @@
+import multiprocessing
 import sys
 
-if "pytest" not in sys.modules:
+# The add-on is not initialized in worker processes, which only import the modules whose functions they run.
+# Their parent process is only known once the function to run is loaded, but they're named as soon as they start.
+if "pytest" not in sys.modules and multiprocessing.current_process().name == "MainProcess":
     from .main import init
 
     init()
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from concurrent.futures import Future
+
+from aqt import gui_hooks, mw
+from aqt.utils import tooltip
+
+from .importers import IMPORTERS
+from .importers.backfill import MediaBackfill, MediaBackfillQueue
+from .log import logger
+
+# Number of processed files between progress notifications
+PROGRESS_INTERVAL = 100
+
+_running: tuple[MediaBackfill, Future] | None = None
+# Whether to download the queue again once the running backfill is done, for files queued in the meantime
+_restart = False
+
+
+def start_media_backfill() -> None:
+    """Download the media files queued by imports in the background, if any.
+
+    If queued files are already being downloaded, the files queued since are downloaded afterwards.
+    """
+    global _running, _restart
+
+    if not mw.col:
+        return
+    if _running:
+        _restart = True
+        return
+    queue = MediaBackfillQueue.for_collection(mw.col.path)
+    if not len(queue):
+        return
+    backfill = MediaBackfill(mw.col, queue, {importer_class.name: importer_class for importer_class in IMPORTERS})
+
+    def on_progress(processed: int, total: int) -> None:
+        if processed % PROGRESS_INTERVAL == 0:
+            mw.taskman.run_on_main(lambda: tooltip(f"Downloading media files: {processed}/{total}", parent=mw))
+
+    def on_done(fut: Future) -> None:
+        global _running, _restart
+
+        _running = None
+        restart, _restart = _restart, False
+        try:
+            count = fut.result()
+        except Exception:
+            logger.exception("Failed to download queued media files")
+            count = 0
+        if count:
+            tooltip(f"Downloaded {count} media files.", parent=mw)
+        if restart:
+            start_media_backfill()
+
+    logger.info("downloading queued media files", count=len(queue))
+    future = mw.taskman.run_in_background(lambda: backfill.run(on_progress), on_done)
+    _running = (backfill, future)
+
+
+def stop_media_backfill() -> None:
+    """Cancel downloading queued media files.
+
+    Returns without waiting for the downloads in progress, but once no more files will be written to the collection.
+    """
+    global _restart
+
+    if not _running:
+        return
+    backfill, _ = _running
+    _restart = False
+    backfill.stop()
+
+
+def setup_media_backfill() -> None:
+    gui_hooks.profile_did_open.append(start_media_backfill)
+    gui_hooks.profile_will_close.append(stop_media_backfill)
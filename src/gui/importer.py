@@ -3,9 +3,10 @@ from __future__ import annotations
 from concurrent.futures import Future
 
 from aqt.main import AnkiQt
-from aqt.qt import QFormLayout, QPushButton, qconnect
+from aqt.qt import QCheckBox, QFormLayout, QPushButton, qconnect
 from aqt.utils import showText, showWarning, tooltip
 
+from ..backfill import start_media_backfill
 from ..consts import consts
 from ..importers.errors import CopycatImporterCanceled, CopycatImporterError
 from ..importers.importer import CopycatImporter
@@ -33,6 +34,17 @@ class ImporterDialog(Dialog):
         layout = QFormLayout(self)
         self.importer_widget = IMPORTER_WIDGETS[self.importer_class.name](self)
         layout.addRow(self.importer_widget)
+        self.incremental_checkbox = QCheckBox("Only import new and changed notes", self)
+        self.incremental_checkbox.setToolTip(
+            "Update notes imported previously in place and skip the ones that did not change since the last import."
+        )
+        layout.addRow(self.incremental_checkbox)
+        self.resume_checkbox: QCheckBox | None = None
+        if self.importer_class.can_resume(self.mw):
+            self.resume_checkbox = QCheckBox("Resume previous import", self)
+            self.resume_checkbox.setToolTip("Continue the last unfinished import instead of starting over.")
+            self.resume_checkbox.setChecked(True)
+            layout.addRow(self.resume_checkbox)
         layout.addRow(import_button)
         super().setup_ui()
 
@@ -40,6 +52,9 @@ class ImporterDialog(Dialog):
         options = self.importer_widget.on_import()
         if options is None:
             return
+        options["incremental"] = self.incremental_checkbox.isChecked()
+        if self.resume_checkbox:
+            options["resume"] = self.resume_checkbox.isChecked()
         self.accept()
 
         self.mw.progress.start(
@@ -72,5 +87,8 @@ class ImporterDialog(Dialog):
                 tooltip("Canceled")
             except CopycatImporterError as exc:
                 showWarning(str(exc), parent=self.mw, title=consts.name)
+            finally:
+                # Download the media files queued by the import
+                start_media_backfill()
 
         self.mw.taskman.run_in_background(start_importing, on_done)
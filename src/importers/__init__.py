@@ -1,5 +1,33 @@
-from .algoapp import AlgoAppImporter
-from .importer import CopycatImporter
-from .noji import NojiImporter
+from __future__ import annotations
 
-IMPORTERS: list[type[CopycatImporter]] = [AlgoAppImporter, NojiImporter]
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .algoapp import AlgoAppImporter
+    from .importer import CopycatImporter
+    from .noji import NojiImporter
+
+    IMPORTERS: list[type[CopycatImporter]]
+
+__all__ = ["IMPORTERS", "AlgoAppImporter", "CopycatImporter", "NojiImporter"]
+
+
+def __getattr__(name: str) -> Any:
+    """Import the importers on first use.
+
+    Importing them reads the add-on's config through the main window, which worker processes don't have,
+    so worker processes can import modules like `blobrefs` without it.
+    """
+    if name not in __all__:
+        raise AttributeError(name)
+    from .algoapp import AlgoAppImporter  # noqa: PLC0415
+    from .importer import CopycatImporter  # noqa: PLC0415
+    from .noji import NojiImporter  # noqa: PLC0415
+
+    globals().update(
+        IMPORTERS=[AlgoAppImporter, NojiImporter],
+        AlgoAppImporter=AlgoAppImporter,
+        CopycatImporter=CopycatImporter,
+        NojiImporter=NojiImporter,
+    )
+    return globals()[name]
@@ -1,9 +1,14 @@
 from __future__ import annotations
 
 import dataclasses
+import multiprocessing
 import re
+import sys
+import threading
 import time
-from collections.abc import Iterable, Iterator, MutableSet
+from collections.abc import ItemsView, Iterable, Iterator, MutableSet
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from re import Match
 from textwrap import dedent
 from typing import TYPE_CHECKING, Any
@@ -12,15 +17,33 @@ import requests
 from anki.decks import DeckId
 
 if TYPE_CHECKING:
-    from anki.models import NotetypeId
+    from anki.models import NotetypeDict, NotetypeId
+    from anki.notes import Note
     from aqt.main import AnkiQt
 
 from ..config import config
 from ..log import logger
+from .backfill import MediaBackfillQueue
+from .blobrefs import ALGOAPP_BLOB_REF_PATTERNS, BlobRefRewriter, init_worker, rewrite_fields_shard
+from .decks import DeckResolver
 from .errors import CopycatImporterCanceled
-from .httpclient import HttpClient
+from .httpclient import DownloadedFile, HttpClient
 from .importer import CopycatImporter
-from .utils import fname_to_link, guess_extension
+from .jsonstream import JsonStreamReader
+from .media import MediaIndex
+from .notetypes import NotetypeIndex
+from .pipeline import ImportPipeline
+from .sources import SourceMap
+from .utils import (
+    batched,
+    fingerprint,
+    fname_to_link,
+    guess_extension,
+    guid_for,
+    imap_ordered,
+    map_concurrently,
+)
+from .writer import NoteWriter
 
 INVALID_FIELD_CHARS_RE = re.compile('[:"{}]')
 
@@ -41,6 +64,8 @@ class FieldSet(MutableSet):
 
     def __init__(self, iterable: Iterable | None = None) -> None:
         self.map: dict[str, str] = {}
+        # Number of keys for each case-folded key, for case-insensitive membership tests
+        self.folded_keys: dict[str, int] = {}
         super().__init__()
         if iterable:
             for el in iterable:
@@ -48,16 +73,27 @@ class FieldSet(MutableSet):
 
     def add(self, key: str) -> None:
         value = key if key not in self else f"{key}+"
+        if key not in self.map:
+            folded_key = key.casefold()
+            self.folded_keys[folded_key] = self.folded_keys.get(folded_key, 0) + 1
         self.map[key] = fix_field_name(value)
 
     def discard(self, value: str) -> None:
         if value in self.map:
             del self.map[value]
+            folded_key = value.casefold()
+            self.folded_keys[folded_key] -= 1
+            if not self.folded_keys[folded_key]:
+                del self.folded_keys[folded_key]
 
     def get(self, key: str) -> str | None:
         """Return `key` as stored in the set or `None` if not found."""
         return self.map.get(key)
 
+    def items(self) -> ItemsView[str, str]:
+        """Return pairs of field names as added and as stored in the set."""
+        return self.map.items()
+
     def __iter__(self) -> Iterator[str]:
         return iter(self.map.values())
 
@@ -65,10 +101,7 @@ class FieldSet(MutableSet):
         return len(self.map)
 
     def __contains__(self, field: Any) -> bool:
-        for key in self.map:
-            if key.lower() == field.lower():
-                return True
-        return False
+        return field.casefold() in self.folded_keys
 
     def __repr__(self) -> str:
         return repr(list(self.map.values()))
@@ -168,141 +201,241 @@ class AlgoAppCard:
 
 
 class AlgoAppMedia:
-    def __init__(self, ID: str, mime: str, data: bytes):
+    def __init__(self, ID: str, mime: str, file: DownloadedFile):
         self.ID = ID
         self.mime = mime
         self.ext = guess_extension(mime)
-        self.data = data
+        # Downloaded file, released once written to the media folder
+        self.file: DownloadedFile | None = file
         self.filename: str | None = None  # Filename in Anki
 
 
+@dataclasses.dataclass
+class AlgoAppBatch:
+    """A batch of a deck's cards that is ready to be written to the collection."""
+
+    deck: AlgoAppDeck
+    # Position of the deck in the import, starting from 1
+    deck_number: int
+    # Source IDs, cards and fingerprints of the cards to import
+    cards: list[tuple[str, AlgoAppCard, str]]
+    # IDs of all blobs referenced by the cards
+    blob_ids: list[str]
+    # Blobs downloaded for the batch
+    media: list[AlgoAppMedia]
+
+    def discard_media(self) -> None:
+        for media in self.media:
+            if media.file:
+                media.file.discard()
+                media.file = None
+
+
 class AlgoAppImporter(CopycatImporter):
     name = "AlgoApp"
+    api_url = "https://api.algoapp.ai"
+    blobs_url = "https://blobs.algoapp.ai"
+    # Number of cards to fetch before importing them, which is the unit of the import pipeline
+    card_batch_size = 5000
+    # Number of cards whose fields are sent to a worker process at once
+    field_shard_size = 1000
 
-    def __init__(self, mw: AnkiQt, client_id: str, client_token: str, client_version: str):
+    def __init__(
+        self,
+        mw: AnkiQt,
+        client_id: str,
+        client_token: str,
+        client_version: str,
+        incremental: bool = False,
+    ):
         super().__init__()
         self.mw = mw
         self.client_id = client_id
         self.client_token = client_token
         self.client_version = client_version
-        self.http_client = HttpClient()
+        self.incremental = incremental
+        # Set when the import pipeline is closed, so that requests in progress stop once the import is canceled
+        self.stopped = threading.Event()
+        self.http_client = HttpClient(
+            pool_size=max(config["media_download_concurrency"], config["algoapp_deck_concurrency"]),
+            stopped=self.stopped,
+        )
+        self.sources = SourceMap(self.name, self.mw.col)
+        self.note_writer = NoteWriter(self.mw.col, config["note_batch_size"], source_map=self.sources)
         self.decks: dict[str, AlgoAppDeck] = {}
+        self.deck_resolver = DeckResolver(self.mw.col)
         self.notetypes: dict[str, AlgoAppNoteType] = {}
-        self.media: dict[str, AlgoAppMedia] = {}
-        self.cards: dict[str, AlgoAppCard] = {}
-        self.BLOB_REF_PATTERNS = (
-            # Use Anki's HTML media patterns too for completeness
-            *(re.compile(p) for p in mw.col.media.html_media_regexps),
-            re.compile(r"{{blob (?P<fname>.*?)}}"),
-            # AlgoApp uses a form like `<audio id="{blob_id}" type="{mime_type}" />` too
-            # TODO: extract the type attribute
-            # quoted case
-            re.compile(r"(?i)(<(?:img|audio)\b[^>]* id=(?P<str>[\"'])(?P<fname>[^>]+?)(?P=str)[^>]*>)"),
-            # unquoted case
-            re.compile(r"(?i)(<(?:img|audio)\b[^>]* id=(?!['\"])(?P<fname>[^ >]+)[^>]*?>)"),
+        self.notetype_index = NotetypeIndex(self.mw.col)
+        self.media_index = MediaIndex(self.mw.col)
+        self.defer_media = config["download_media"] and config["defer_media_downloads"]
+        self.media_backfill = MediaBackfillQueue.for_collection(self.mw.col.path)
+        # Anki notetypes used by imported notes
+        self.models: dict[NotetypeId, NotetypeDict] = {}
+        # Ordinals of Anki notetype fields keyed by AlgoApp field names, for each pair of AlgoApp and Anki notetypes
+        self.field_ords: dict[tuple[str, NotetypeId], dict[str, int]] = {}
+        # Frozen builds of Anki can't run worker processes, as they'd start Anki itself
+        self.field_processes: int = 0 if getattr(sys, "frozen", False) else config["algoapp_field_processes"]
+        self.field_executor: ProcessPoolExecutor | None = None
+        # Source IDs of the cards and IDs of the blobs seen by the producer of the import pipeline
+        self.imported_source_ids: set[str] = set()
+        self.requested_blob_ids: set[str] = set()
+        # Media refs of written media files, keyed by blob ID
+        self.media_links: dict[str, str] = {}
+        # Use Anki's HTML media patterns too for completeness
+        self.blob_refs = BlobRefRewriter([*mw.col.media.html_media_regexps, *ALGOAPP_BLOB_REF_PATTERNS])
+
+    @staticmethod
+    def _client_headers(client_id: str, client_token: str, client_version: str) -> dict[str, str]:
+        return {
+            "ankiapp-client-id": client_id,
+            "ankiapp-client-token": client_token,
+            "ankiapp-client-version": client_version,
+        }
+
+    def _auth_headers(self) -> dict[str, str]:
+        return self._client_headers(self.client_id, self.client_token, self.client_version)
+
+    @classmethod
+    def media_headers(cls) -> dict[str, str]:
+        options = config.importer_options("ankiapp")
+        return cls._client_headers(
+            options.get("client_id", ""), options.get("client_token", ""), options.get("client_version", "")
         )
 
     def _get_request(self, url: str) -> requests.Response:
-        return self.http_client.request(
-            "GET",
-            url,
-            headers={
-                "ankiapp-client-id": self.client_id,
-                "ankiapp-client-token": self.client_token,
-                "ankiapp-client-version": self.client_version,
-            },
-        )
+        return self.http_client.request("GET", url, headers=self._auth_headers())
+
+    def _api_url(self, path: str) -> str:
+        return f"{self.api_url}/{path}"
 
     def _api_get(self, path: str) -> requests.Response:
-        return self._get_request(f"https://api.algoapp.ai/{path}")
+        return self._get_request(self._api_url(path))
+
+    def _blob_url(self, blob_id: str) -> str:
+        return f"{self.blobs_url}/{blob_id}"
 
     def _get_media(self, blob_id: str) -> AlgoAppMedia | None:
         if not config["download_media"]:
             return None
         try:
-            response = self._get_request(f"https://blobs.algoapp.ai/{blob_id}")
-            data = response.content
-            mime = response.headers.get("content-type")
-            if not mime:
-                return None
-            return AlgoAppMedia(blob_id, mime, data)
+            url = self._blob_url(blob_id)
+            media_file = self.http_client.download(url, cache_key=url, headers=self._auth_headers())
         except Exception:
             return None
-
-    def _import_decks(self) -> None:
+        if not media_file.mime:
+            media_file.discard()
+            return None
+        return AlgoAppMedia(blob_id, media_file.mime, media_file)
+
+    def _write_media(self, media: AlgoAppMedia) -> None:
+        """Write a downloaded media file to the collection and release it."""
+        assert media.file is not None
+        # Identical files that already exist are reused
+        media.filename = self.media_index.write(media.ID + media.ext, media.file.path)
+        self.media_links[media.ID] = fname_to_link(media.filename)
+        media.file.discard()
+        media.file = None
+
+    def _fetch_decks(self) -> None:
         self._update_progress("Fetching decks...")
+        decks_data = self._api_get("decks").json()
         for key in ("share", "user", "subscriptions"):
-            for deck in self._api_get("decks").json().get(key, []):
-                print(deck)
+            for deck in decks_data.get(key, []):
                 self.decks[deck["id"]] = AlgoAppDeck(
                     ID=deck["id"],
                     name=deck["name"],
                     description=deck.get("description", ""),
                 )
-        self._update_progress("Importing decks...")
-        for deck in self.decks.values():
-            did = DeckId(self.mw.col.decks.add_normal_deck_with_name(deck.name).id)
-            deck.did = did
-            deck_dict = self.mw.col.decks.get(did)
-            if not deck_dict.get("desc"):
-                deck_dict["desc"] = deck.description
-                self.mw.col.decks.update_dict(deck_dict)
-
-    def _fetch_cards(self) -> None:
-        self._update_progress("Fetching cards...")
-        for deck in self.decks.values():
-            deck_data = self._api_get(f"decks/{deck.ID}").json()
-            deck_layouts = []
-
-            if "config" in deck_data:
-                field_names = FieldSet()
-                template_fields: list[list[str]] = [[], []]
-                for field in deck_data.get("config", {}).get("fields", []):
-                    field_names.add(field["name"])
-                    for i, side in enumerate(field["sides"]):
-                        if side == 1:
-                            template_fields[i].append(field_names.get(field["name"]))
-                notetype_name = deck.name
-                notetype: AlgoAppNoteType
-                if any(not t for t in template_fields):
-                    notetype = FallbackNotetype(field_names, notetype_name)
+
+    def _add_deck(self, deck: AlgoAppDeck) -> None:
+        deck.did = self.deck_resolver.get_or_add(deck.name, deck.description)
+
+    def _fetch_deck_data(self, deck: AlgoAppDeck) -> DownloadedFile:
+        # Saved to disk and parsed incrementally, as the data of large decks takes a lot of memory once parsed
+        return self.http_client.download(self._api_url(f"decks/{deck.ID}"), headers=self._auth_headers())
+
+    def _iter_deck_cards(self, deck: AlgoAppDeck, deck_file: DownloadedFile) -> Iterator[tuple[str, AlgoAppCard]]:
+        """Collect the notetypes of a deck and yield its cards.
+
+        Knols are parsed one at a time if they come after the notetype data. Otherwise, they're loaded at once.
+        """
+        deck_data: dict[str, Any] = {}
+        deck_layouts: list[str] | None = None
+        with open(deck_file.path, encoding="utf-8") as file:
+            reader = JsonStreamReader(file)
+            for key in reader.iter_object():
+                if key == "knols" and ("config" in deck_data or "layouts" in deck_data):
+                    deck_layouts = self._add_deck_notetypes(deck, deck_data)
+                    for knol_data in reader.iter_array():
+                        yield from self._knol_cards(deck, deck_layouts, knol_data)
                 else:
-                    notetype = AlgoAppNoteType(
-                        notetype_name,
-                        field_names,
-                        FallbackNotetype.CSS,
-                        field_list_to_refs(template_fields[0]),
-                        field_list_to_refs(template_fields[1]),
-                    )
-                self.notetypes[deck.ID] = notetype
-                deck_layouts.append(deck.ID)
+                    deck_data[key] = reader.read_value()
+        if deck_layouts is None:
+            deck_layouts = self._add_deck_notetypes(deck, deck_data)
+            for knol_data in deck_data.get("knols", []):
+                yield from self._knol_cards(deck, deck_layouts, knol_data)
+
+    def _knol_cards(
+        self, deck: AlgoAppDeck, deck_layouts: list[str], knol_data: dict[str, Any]
+    ) -> Iterator[tuple[str, AlgoAppCard]]:
+        for i, layout_id in enumerate(deck_layouts):
+            yield (
+                f"{knol_data['id']}_{i}",
+                AlgoAppCard(
+                    layout_id=layout_id,
+                    deck=deck,
+                    # Copied as fields are rewritten separately for each card of the knol
+                    fields=dict(knol_data.get("values", {})),
+                    tags=knol_data.get("tags", []),
+                ),
+            )
+
+    def _add_deck_notetypes(self, deck: AlgoAppDeck, deck_data: dict[str, Any]) -> list[str]:
+        """Collect the notetypes of a deck and return the IDs of its layouts."""
+        deck_layouts = []
+
+        if "config" in deck_data:
+            field_names = FieldSet()
+            template_fields: list[list[str]] = [[], []]
+            for field in deck_data.get("config", {}).get("fields", []):
+                field_names.add(field["name"])
+                for i, side in enumerate(field["sides"]):
+                    if side == 1:
+                        template_fields[i].append(field_names.get(field["name"]))
+            notetype_name = deck.name
+            notetype: AlgoAppNoteType
+            if any(not t for t in template_fields):
+                notetype = FallbackNotetype(field_names, notetype_name)
             else:
-                for layout in deck_data.get("layouts", []):
-                    name = layout["name"]
-                    fields = layout["knol_keys"] or []
-                    style = layout["style"] or ""
-                    templates = layout["templates"]
-                    self.notetypes[layout["id"]] = AlgoAppNoteType(
-                        name=name,
-                        fields=FieldSet(fields),
-                        style=style,
-                        front=templates[0],
-                        back=templates[1],
-                    )
-                    deck_layouts.append(layout["id"])
+                notetype = AlgoAppNoteType(
+                    notetype_name,
+                    field_names,
+                    FallbackNotetype.CSS,
+                    field_list_to_refs(template_fields[0]),
+                    field_list_to_refs(template_fields[1]),
+                )
+            self.notetypes[deck.ID] = notetype
+            deck_layouts.append(deck.ID)
+        else:
+            for layout in deck_data.get("layouts", []):
+                name = layout["name"]
+                fields = layout["knol_keys"] or []
+                style = layout["style"] or ""
+                templates = layout["templates"]
+                self.notetypes[layout["id"]] = AlgoAppNoteType(
+                    name=name,
+                    fields=FieldSet(fields),
+                    style=style,
+                    front=templates[0],
+                    back=templates[1],
+                )
+                deck_layouts.append(layout["id"])
 
-            for knol_data in deck_data.get("knols", []):
-                for i, layout_id in enumerate(deck_layouts):
-                    self.cards[f"{knol_data['id']}_{i}"] = AlgoAppCard(
-                        layout_id=layout_id,
-                        deck=deck,
-                        fields=knol_data.get("values", {}),
-                        tags=knol_data.get("tags", []),
-                    )
-
-    def _import_notetypes(self) -> None:
-        self._update_progress("Importing notetypes...")
-        for notetype in self.notetypes.values():
+        return deck_layouts
+
+    def _get_model(self, notetype: AlgoAppNoteType) -> NotetypeDict:
+        """Return the Anki notetype of `notetype`, reusing a matching notetype or adding one on first use."""
+        if notetype.mid is None:
             model = self.mw.col.models.new(notetype.name)
             for field_name in notetype.fields:
                 field_dict = self.mw.col.models.new_field(field_name)
@@ -313,58 +446,306 @@ class AlgoAppImporter(CopycatImporter):
             self.mw.col.models.add_template(model, template_dict)
             model["css"] = notetype.style
             try:
-                self.mw.col.models.add(model)
+                model = self.notetype_index.get_or_add(model)
             except Exception:
                 logger.error("Failed to add notetype: %s", notetype, exc_info=True)
                 raise
             notetype.mid = model["id"]
+        return self._model(notetype.mid)
 
-    def _import_media(self) -> None:
-        self._update_progress("Importing media...")
-        for media in self.media.values():
-            filename = self.mw.col.media.write_data(media.ID + media.ext, media.data)
-            media.filename = filename
-
-    def _import_cards(self) -> int:
-        self._fetch_cards()
-        self._import_notetypes()
-        self._import_media()
-
-        self._update_progress("Importing cards...")
-        last_progress = 0.0
-        notes_count = 0
-
-        for card in self.cards.values():
-            for field_name, contents in card.fields.items():
-                for ref_re in self.BLOB_REF_PATTERNS:
-                    card.fields[field_name] = ref_re.sub(self._repl_blob_ref, card.fields[field_name])
-
-            notetype = self.notetypes.get(card.deck.ID, self.notetypes[card.layout_id])
-            assert notetype.mid is not None
-            model = self.mw.col.models.get(notetype.mid)
+    def _model(self, mid: NotetypeId) -> NotetypeDict:
+        model = self.models.get(mid)
+        if model is None:
+            model = self.mw.col.models.get(mid)
             assert model is not None
+            self.models[mid] = model
+        return model
+
+    def _field_ords(self, notetype_key: str, model: NotetypeDict) -> dict[str, int]:
+        """Return the ordinals of the fields of `model` keyed by the field names of an AlgoApp notetype."""
+        cache_key = (notetype_key, model["id"])
+        field_ords = self.field_ords.get(cache_key)
+        if field_ords is None:
+            ords_by_name = {field["name"]: field["ord"] for field in model["flds"]}
+            field_ords = {
+                field_name: ords_by_name[normalized_field_name]
+                for field_name, normalized_field_name in self.notetypes[notetype_key].fields.items()
+                if normalized_field_name in ords_by_name
+            }
+            self.field_ords[cache_key] = field_ords
+        return field_ords
+
+    def _source_changed(self, source_id: str, card_fingerprint: str) -> bool:
+        """Whether `source_id` is new or changed since it was last imported."""
+        source = self.sources.get(source_id)
+        return not source or source[1] != card_fingerprint
+
+    def _existing_note(self, source_id: str) -> Note | None:
+        """Return the note previously imported from `source_id`, if any."""
+        source = self.sources.get(source_id)
+        if not source:
+            return None
+        return self.mw.col.get_note(source[0])
+
+    def _blob_types(self, cards: Iterable[AlgoAppCard]) -> dict[str, str]:
+        """Return the media types of the blobs referenced in the fields of `cards`, keyed by their unique IDs.
+
+        Types are suggested by the references, see `BlobRefRewriter.blob_types()`.
+        """
+        blob_types: dict[str, str] = {}
+        for card in cards:
+            for contents in card.fields.values():
+                for blob_id, blob_type in self.blob_refs.blob_types(contents):
+                    # Exact types are preferred over the kinds of references
+                    if blob_types.get(blob_id, "*/*").endswith("/*"):
+                        blob_types[blob_id] = blob_type
+        return blob_types
+
+    def _note_for_card(self, source_id: str, card: AlgoAppCard, existing_note: Note | None) -> Note:
+        """Fill the fields of a new note or of `existing_note` if passed from `card`."""
+        notetype_key = card.deck.ID if card.deck.ID in self.notetypes else card.layout_id
+        notetype = self.notetypes[notetype_key]
+        if existing_note:
+            note = existing_note
+            model = self._model(note.mid)
+        else:
+            model = self._get_model(notetype)
             note = self.mw.col.new_note(model)
-            for field_name, contents in card.fields.items():
-                normalized_field_name = notetype.fields.get(field_name)
-                if normalized_field_name:
-                    note[normalized_field_name] = contents
-                else:
-                    logger.warning(
-                        "field '%s' not in notetype '%s' but used in card",
-                        field_name,
-                        notetype.name,
-                    )
-            note.tags = card.tags
-            assert card.deck.did is not None
-            self.mw.col.add_note(note, card.deck.did)
-            notes_count += 1
-            if time.time() - last_progress >= 0.1:
-                self._update_progress(
-                    label=f"Imported {notes_count} out of {len(self.cards)} cards",
-                    value=notes_count,
-                    max=len(self.cards),
+            note.guid = guid_for(self.name, card.deck.ID, source_id)
+        field_ords = self._field_ords(notetype_key, model)
+        for field_name, contents in card.fields.items():
+            field_ord = field_ords.get(field_name)
+            if field_ord is not None:
+                note.fields[field_ord] = contents
+            else:
+                logger.warning(
+                    "field '%s' not in notetype '%s' but used in card",
+                    field_name,
+                    notetype.name,
+                )
+        note.tags = card.tags
+        return note
+
+    def _get_field_executor(self) -> ProcessPoolExecutor:
+        if self.field_executor is None:
+            self.field_executor = ProcessPoolExecutor(
+                max_workers=self.field_processes,
+                # Forking Anki's process is not safe
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(self.blob_refs.patterns,),
+            )
+        return self.field_executor
+
+    def _shutdown_field_executor(self) -> None:
+        if self.field_executor is not None:
+            self.field_executor.shutdown(cancel_futures=True)
+            self.field_executor = None
+
+    def _rewrite_fields_in_processes(self, cards: list[AlgoAppCard], links: dict[str, str]) -> list[str]:
+        """Rewrite the fields of `cards` in worker processes and return the IDs of the missing blobs."""
+        executor = self._get_field_executor()
+        shards = [cards[i : i + self.field_shard_size] for i in range(0, len(cards), self.field_shard_size)]
+        futures = [executor.submit(rewrite_fields_shard, [card.fields for card in shard], links) for shard in shards]
+        try:
+            results = [future.result() for future in futures]
+        finally:
+            for future in futures:
+                future.cancel()
+        # Only applied once all shards are done, so that fields are never rewritten twice when falling back
+        missing_blob_ids = []
+        for shard, (shard_fields, shard_missing_blob_ids) in zip(shards, results):
+            for card, fields in zip(shard, shard_fields):
+                card.fields = fields
+            missing_blob_ids.extend(shard_missing_blob_ids)
+        return missing_blob_ids
+
+    def _rewrite_fields(self, cards: list[AlgoAppCard], blob_ids: list[str]) -> None:
+        """Rewrite media references in the fields of `cards` to point to the imported media files.
+
+        `blob_ids` are the IDs of the blobs referenced by `cards`.
+        """
+        self._update_progress("Transforming fields...")
+        use_processes = self.field_processes > 0 and len(cards) > self.field_shard_size
+        missing_blob_ids: list[str] = []
+        if use_processes:
+            # Only the links used by the cards are sent to workers
+            links = {blob_id: self.media_links[blob_id] for blob_id in blob_ids if blob_id in self.media_links}
+            try:
+                missing_blob_ids = self._rewrite_fields_in_processes(cards, links)
+            except (OSError, BrokenProcessPool):
+                logger.warning(
+                    "Failed to transform fields in worker processes, falling back to this process", exc_info=True
                 )
+                self._shutdown_field_executor()
+                self.field_processes = 0
+                use_processes = False
+        if not use_processes:
+            for card in cards:
+                card.fields = self.blob_refs.rewrite_fields(card.fields, self.media_links, missing_blob_ids)
+        self.warnings.extend(f"Missing media file: {blob_id}" for blob_id in missing_blob_ids)
+
+    def _deferred_media_ext(self, blob_id: str, blob_type: str) -> str:
+        """Return the extension of a blob whose download is deferred, given the type suggested by its references.
+
+        If the references don't have an exact type, the type is requested from the server without downloading the blob.
+        """
+        ext = None if blob_type.endswith("/*") else guess_extension(blob_type)
+        if ext:
+            return ext
+        try:
+            mime = self.http_client.request("HEAD", self._blob_url(blob_id), headers=self._auth_headers()).headers.get(
+                "Content-Type"
+            )
+        except Exception:
+            logger.warning("Failed to get the type of media file", blob_id=blob_id, exc_info=True)
+            mime = None
+        ext = guess_extension(mime) if mime else None
+        if ext:
+            return ext
+        # The link is made from the extension, so audio must not be linked as an image
+        return ".mp3" if blob_type.startswith("audio/") else ".png"
+
+    def _download_media(self, blob_types: dict[str, str]) -> list[AlgoAppMedia]:
+        """Download the blobs that weren't downloaded before concurrently.
+
+        `blob_types` maps blob IDs to the types suggested by their references.
+        Blobs already present in the media folder are linked without downloading them,
+        and if media downloads are deferred, the other blobs are linked and queued to be downloaded after the import.
+        """
+        blob_ids = [blob_id for blob_id in blob_types if blob_id not in self.requested_blob_ids]
+        self.requested_blob_ids.update(blob_ids)
+        to_download = []
+        to_defer = []
+        for blob_id in blob_ids:
+            existing_name = self.media_index.find_by_id(blob_id)
+            if existing_name:
+                self.media_links[blob_id] = fname_to_link(existing_name)
+            elif self.defer_media:
+                to_defer.append(blob_id)
+            else:
+                to_download.append(blob_id)
+        exts = map_concurrently(
+            lambda blob_id: self._deferred_media_ext(blob_id, blob_types[blob_id]),
+            to_defer,
+            config["media_download_concurrency"],
+        )
+        for blob_id, ext in exts.items():
+            url = self._blob_url(blob_id)
+            filename = blob_id + ext
+            self.media_backfill.add(filename, self.name, {"url": url}, cache_key=url)
+            self.media_links[blob_id] = fname_to_link(filename)
+        downloaded_media = []
+        for media in imap_ordered(self._get_media, to_download, config["media_download_concurrency"]):
+            if media and self._check_media_mime(media):
+                downloaded_media.append(media)
+            elif media and media.file:
+                media.file.discard()
+        return downloaded_media
+
+    def _prepare_batch(self, deck: AlgoAppDeck, deck_number: int, cards: list[tuple[str, AlgoAppCard]]) -> AlgoAppBatch:
+        """Select the cards to import from a batch of a deck's cards and download their media.
+
+        Cards of knols in multiple decks are only imported once, and unchanged cards are left out in incremental mode.
+        """
+        cards_to_import = []
+        for source_id, card in cards:
+            if source_id in self.imported_source_ids:
+                continue
+            self.imported_source_ids.add(source_id)
+            # Computed before media references are rewritten
+            card_fingerprint = fingerprint([card.layout_id, card.fields, card.tags])
+            if self.incremental and not self._source_changed(source_id, card_fingerprint):
+                continue
+            cards_to_import.append((source_id, card, card_fingerprint))
+        blob_types = self._blob_types(card for _, card, _ in cards_to_import)
+        return AlgoAppBatch(deck, deck_number, cards_to_import, list(blob_types), self._download_media(blob_types))
+
+    def _fetch_batches(self, decks: list[AlgoAppDeck]) -> Iterator[AlgoAppBatch]:
+        """Fetch decks and yield batches of their cards that are ready to be imported.
+
+        At least one batch is yielded for each deck, so that empty decks are created too.
+        """
+        # Decks are processed in order, so the result doesn't depend on which request finishes first
+        deck_files = imap_ordered(
+            self._fetch_deck_data, decks, config["algoapp_deck_concurrency"], discard=DownloadedFile.discard
+        )
+        try:
+            for deck_number, (deck, deck_file) in enumerate(zip(decks, deck_files), start=1):
+                try:
+                    empty = True
+                    # Cards are imported in batches as the deck is parsed, so that only a few batches are held in memory
+                    for cards in batched(self._iter_deck_cards(deck, deck_file), self.card_batch_size):
+                        empty = False
+                        yield self._prepare_batch(deck, deck_number, cards)
+                    if empty:
+                        yield AlgoAppBatch(deck, deck_number, [], [], [])
+                finally:
+                    deck_file.discard()
+        finally:
+            # Discards the decks that were fetched ahead if the import stops early
+            deck_files.close()
+
+    def _write_batch(self, batch: AlgoAppBatch, progress_label: str, notes_count: int) -> int:
+        """Write a batch of cards and their media to the collection.
+
+        `notes_count` is the number of notes imported before the batch, for progress reporting.
+        """
+        deck = batch.deck
+        assert deck.did is not None
+        for media in batch.media:
+            self._write_media(media)
+        cards = [card for _, card, _ in batch.cards]
+        self._rewrite_fields(cards, batch.blob_ids)
+        last_progress = 0.0
+        for i, (source_id, card, card_fingerprint) in enumerate(batch.cards):
+            if time.time() - last_progress >= 0.1:
+                self._update_progress(label=f"{progress_label}: imported {notes_count + i} cards")
                 last_progress = time.time()
+            existing_note = self._existing_note(source_id) if self.incremental else None
+            note = self._note_for_card(source_id, card, existing_note)
+            if existing_note:
+                self.note_writer.update(note, source_id, card_fingerprint)
+            else:
+                self.note_writer.add(note, deck.did, source_id, card_fingerprint)
+        return len(batch.cards)
+
+    def _commit(self) -> None:
+        self.note_writer.flush()
+        self.sources.save()
+        self.media_backfill.save()
+
+    def _import_cards(self) -> int:
+        """Import decks one at a time, fetching decks and media in the background while cards are written."""
+        decks = list(self.decks.values())
+        notes_count = 0
+        current_deck: AlgoAppDeck | None = None
+        progress_label = ""
+        pipeline = ImportPipeline(
+            self._fetch_batches(decks),
+            config["import_queue_size"],
+            discard=AlgoAppBatch.discard_media,
+            stopped=self.stopped,
+        )
+        try:
+            with pipeline:
+                for batch in pipeline:
+                    if batch.deck is not current_deck:
+                        if current_deck:
+                            # Commit each deck once all its cards are written
+                            self._commit()
+                            logger.info("imported deck", deck=current_deck.name, notes=notes_count)
+                        current_deck = batch.deck
+                        self._add_deck(current_deck)
+                        progress_label = f"Deck {batch.deck_number} out of {len(decks)} ({current_deck.name})"
+                        self._update_progress(label=progress_label, value=batch.deck_number - 1, max=len(decks))
+                    try:
+                        notes_count += self._write_batch(batch, progress_label, notes_count)
+                    finally:
+                        batch.discard_media()
+        finally:
+            self._commit()
+            self.deck_resolver.apply_descriptions()
 
         return notes_count
 
@@ -385,25 +766,10 @@ class AlgoAppImporter(CopycatImporter):
             return False
         return True
 
-    def _repl_blob_ref(self, match: Match[str]) -> str:
-        blob_id = match.group("fname").partition(".")[0]
-        media_obj = None
-        if blob_id in self.media:
-            media_obj = self.media[blob_id]
-        else:
-            media_obj = self._get_media(blob_id)
-            if media_obj and self._check_media_mime(media_obj):
-                filename = self.mw.col.media.write_data(media_obj.ID + media_obj.ext, media_obj.data)
-                media_obj.filename = filename
-                self.media[media_obj.ID] = media_obj
-        if media_obj and media_obj.filename:
-            return fname_to_link(media_obj.filename)
-        if not (blob_id.startswith("https://") or blob_id.startswith("http://")):
-            self.warnings.append(f"Missing media file: {blob_id}")
-            # dummy image ref
-            return f'<img src="{blob_id}.jpg"></img>'
-        return match.group(0)
-
     def do_import(self) -> int:
-        self._import_decks()
-        return self._import_cards()
+        try:
+            self._fetch_decks()
+            return self._import_cards()
+        finally:
+            self._shutdown_field_executor()
+            self.http_client.log_pool_stats()
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import json
+import threading
+from collections.abc import Generator, Mapping
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable
+
+from anki.utils import checksum
+
+from ..config import config
+from ..consts import consts
+from ..log import logger
+from .errors import CopycatImporterCanceled
+from .httpclient import DownloadedFile, HttpClient
+from .utils import batched, imap_ordered
+
+if TYPE_CHECKING:
+    from anki.collection import Collection
+
+    from .importer import CopycatImporter
+
+
+class MediaBackfillQueue:
+    """Media files referenced by imported notes that are still to be downloaded, keyed by their filenames in Anki.
+
+    Persisted in the user_files folder, so that downloads can continue in later sessions.
+    Files are queued with what their importer needs to get their URLs, see `CopycatImporter.resolve_media_urls()`.
+    Auth headers are not saved, but looked up by importer name when the files are downloaded.
+    """
+
+    # Number of failed downloads after which a file is dropped from the queue
+    max_attempts = 3
+    # Queues shared by imports and backfills, keyed by collection path
+    _shared: dict[str, MediaBackfillQueue] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, col_path: str) -> None:
+        self.path = consts.dir / "user_files" / f"media_backfill_{checksum(col_path)[:8]}.json"
+        self.entries: dict[str, dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.dirty = False
+        self._load()
+
+    @classmethod
+    def for_collection(cls, col_path: str) -> MediaBackfillQueue:
+        """Return the queue of a collection that is shared within this session.
+
+        Imports can then add files while the queue is being downloaded, without either overwriting the other's changes.
+        """
+        with cls._shared_lock:
+            if col_path not in cls._shared:
+                cls._shared[col_path] = cls(col_path)
+            return cls._shared[col_path]
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                self.entries = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logger.exception("Failed to read media backfill queue", path=str(self.path))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def items(self) -> list[tuple[str, dict[str, Any]]]:
+        with self.lock:
+            return list(self.entries.items())
+
+    def add(self, filename: str, importer_name: str, source: dict[str, Any], cache_key: str | None = None) -> None:
+        with self.lock:
+            self.entries[filename] = {
+                "source": source,
+                "cache_key": cache_key,
+                "importer": importer_name,
+                "attempts": 0,
+            }
+            self.dirty = True
+
+    def remove(self, filename: str) -> None:
+        with self.lock:
+            self.entries.pop(filename, None)
+            self.dirty = True
+
+    def fail(self, filename: str) -> None:
+        """Record a failed download of `filename`, dropping it once it failed `max_attempts` times."""
+        with self.lock:
+            entry = self.entries.get(filename)
+            if not entry:
+                return
+            entry["attempts"] += 1
+            if entry["attempts"] >= self.max_attempts:
+                logger.warning("Giving up on media file", filename=filename, source=entry["source"])
+                del self.entries[filename]
+            self.dirty = True
+
+    def save(self) -> None:
+        with self.lock:
+            if not self.dirty:
+                return
+            if not self.entries:
+                self.path.unlink(missing_ok=True)
+            else:
+                tmp_path = self.path.with_suffix(".tmp")
+                with open(tmp_path, "w", encoding="utf-8") as file:
+                    json.dump(self.entries, file)
+                tmp_path.replace(self.path)
+            self.dirty = False
+
+
+class MediaBackfill:
+    """Download the files of a media backfill queue and write them to the collection's media folder."""
+
+    # Number of processed files after which the queue is saved
+    save_interval = 50
+    # Number of files whose URLs are resolved at once, so that URLs that expire are used soon after they're resolved
+    chunk_size = 200
+
+    def __init__(
+        self, col: Collection, queue: MediaBackfillQueue, importers: Mapping[str, type[CopycatImporter]]
+    ) -> None:
+        """`importers` maps importer names to the importers that queued files, which resolve their URLs."""
+        self.col = col
+        self.queue = queue
+        self.importers = importers
+        self.headers = {name: importer_class.media_headers() for name, importer_class in importers.items()}
+        self.stopped = threading.Event()
+        self.http_client = HttpClient(pool_size=config["media_download_concurrency"], stopped=self.stopped)
+        # Held while a file is written to the collection
+        self.write_lock = threading.Lock()
+
+    def stop(self) -> None:
+        """Cancel the downloads in progress. The remaining files are kept in the queue.
+
+        Returns without waiting for the downloads to finish, but once no more files will be written to the collection.
+        """
+        self.stopped.set()
+        with self.write_lock:
+            pass
+
+    def _resolve_urls(self, items: list[tuple[str, dict[str, Any]]]) -> list[str | None]:
+        """Return the URLs of the queued files in `items`, or `None` for files whose URLs couldn't be resolved."""
+        items_by_importer: dict[str, list[tuple[str, dict[str, Any]]]] = {}
+        for filename, entry in items:
+            items_by_importer.setdefault(entry["importer"], []).append((filename, entry))
+        urls: dict[str, str | None] = {}
+        for name, importer_items in items_by_importer.items():
+            importer_class = self.importers.get(name)
+            resolved_urls: list[str | None] = [None] * len(importer_items)
+            if importer_class:
+                try:
+                    resolved_urls = importer_class.resolve_media_urls(
+                        self.http_client, [entry["source"] for _, entry in importer_items]
+                    )
+                except Exception:
+                    logger.warning("Failed to resolve media URLs", importer=name, exc_info=True)
+            urls.update(zip((filename for filename, _ in importer_items), resolved_urls))
+        return [urls[filename] for filename, _ in items]
+
+    def _download(self, item: tuple[tuple[str, dict[str, Any]], str | None]) -> DownloadedFile | None:
+        (filename, entry), url = item
+        if self.stopped.is_set():
+            return None
+        if not url:
+            logger.warning("Media file not found", filename=filename, source=entry["source"])
+            return None
+        try:
+            return self.http_client.download(
+                url, cache_key=entry["cache_key"], headers=self.headers.get(entry["importer"], {})
+            )
+        except CopycatImporterCanceled:
+            return None
+        except Exception:
+            logger.warning("Failed to download media file", filename=filename, url=url, exc_info=True)
+            return None
+
+    def _downloads(
+        self, items: list[tuple[str, dict[str, Any]]]
+    ) -> Generator[tuple[str, DownloadedFile | None], None, None]:
+        """Yield the filenames of queued files with their downloads, resolving their URLs a chunk at a time."""
+        for chunk in batched(items, self.chunk_size):
+            if self.stopped.is_set():
+                return
+            downloads = imap_ordered(
+                self._download, list(zip(chunk, self._resolve_urls(chunk))), config["media_download_concurrency"]
+            )
+            try:
+                for (filename, _), media_file in zip(chunk, downloads):
+                    yield filename, media_file
+            finally:
+                downloads.close()
+
+    def _write(self, filename: str, media_file: DownloadedFile) -> None:
+        # Empty placeholders left by failed downloads would make Anki write the file under another name
+        path = Path(self.col.media.dir()) / filename
+        if path.is_file() and not path.stat().st_size:
+            path.unlink()
+        written_name = self.col.media.write_data(filename, media_file.read_bytes())
+        if written_name != filename:
+            logger.warning("Media file was written under another name", filename=filename, written_name=written_name)
+
+    def run(self, on_progress: Callable[[int, int], None] | None = None) -> int:
+        """Download and write the queued files, calling `on_progress` with the numbers of processed and queued files.
+
+        Returns the number of written files.
+        """
+        items = self.queue.items()
+        downloads = self._downloads(items)
+        processed = written = 0
+        try:
+            for filename, media_file in downloads:
+                try:
+                    with self.write_lock:
+                        # Checked with the lock held, so that nothing is written once stop() returns
+                        if self.stopped.is_set():
+                            break
+                        if media_file:
+                            self._write(filename, media_file)
+                finally:
+                    if media_file:
+                        media_file.discard()
+                if media_file:
+                    self.queue.remove(filename)
+                    written += 1
+                else:
+                    self.queue.fail(filename)
+                processed += 1
+                if processed % self.save_interval == 0:
+                    self.queue.save()
+                if on_progress:
+                    on_progress(processed, len(items))
+        finally:
+            downloads.close()
+            self.queue.save()
+            self.http_client.log_pool_stats()
+        return written
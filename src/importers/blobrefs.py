@@ -0,0 +1,168 @@
+"""Detection and rewriting of media references in AlgoApp fields.
+
+This module doesn't depend on Anki, so that it can be used in worker processes.
+"""
+
+from __future__ import annotations
+
+import mimetypes
+import re
+from collections.abc import Iterator, Mapping, Sequence
+from re import Match
+
+ALGOAPP_BLOB_REF_PATTERNS = (
+    r"{{blob (?P<fname>.*?)}}",
+    # AlgoApp uses a form like `<audio id="{blob_id}" type="{mime_type}" />` too
+    # quoted case
+    r"(?i)(<(?:img|audio)\b[^>]* id=(?P<str>[\"'])(?P<fname>[^>]+?)(?P=str)[^>]*>)",
+    # unquoted case
+    r"(?i)(<(?:img|audio)\b[^>]* id=(?!['\"])(?P<fname>[^ >]+)[^>]*?>)",
+)
+
+TYPE_ATTRIBUTE_RE = re.compile(r"(?i)\btype=([\"']?)(?P<type>[\w.+-]+/[\w.+-]+)\1")
+# References that are played as audio, others are shown as images
+AUDIO_REF_RE = re.compile(r"(?i)<(?:audio|source)\b|\[sound:")
+
+GROUP_NAME_RE = re.compile(r"\(\?P(<|=)(\w+)")
+# An optional case-insensitivity flag and capturing group followed by a literal character that isn't repeated
+LEADING_LITERAL_RE = re.compile(r"(?P<flag>\(\?i\))?(?P<group>\((?!\?))?(?P<char>[^\\()\[\].*+?^$|])(?![*+?]|\{\d)")
+
+
+def is_remote(blob_id: str) -> bool:
+    return blob_id.startswith("https://") or blob_id.startswith("http://")
+
+
+class BlobRefRewriter:
+    """Find and replace blob references using a single combined regex.
+
+    `patterns` must each capture the referenced file in a group named `fname`.
+    At any position, the first of `patterns` that matches is used,
+    which gives the same result as applying them one after another for references that don't overlap.
+    """
+
+    def __init__(self, patterns: Sequence[str]) -> None:
+        self.patterns = tuple(patterns)
+        alternatives = []
+        for i, pattern in enumerate(self.patterns):
+            # Group names must be unique in the combined regex
+            renamed = GROUP_NAME_RE.sub(lambda m: f"(?P{m.group(1)}{m.group(2)}_{i}", pattern)
+            alternatives.append(self._alternative(renamed))
+        self.regex = re.compile("|".join(alternatives))
+        self.fname_groups = tuple(f"fname_{i}" for i in range(len(self.patterns)))
+
+    @staticmethod
+    def _alternative(pattern: str) -> str:
+        # Global flags are only allowed at the start of a regex, so scope them to the alternative.
+        # If the pattern starts with a literal character, it's moved out of the scoped group so that
+        # the regex engine can scan for the first characters of the alternatives instead of trying
+        # each alternative at every position, which would be slower than applying the patterns separately.
+        flags = ""
+        prefix = ""
+        match = LEADING_LITERAL_RE.match(pattern)
+        if match:
+            flags = "i" if match.group("flag") else ""
+            char = match.group("char")
+            if not flags or char.lower() == char.upper():
+                prefix = re.escape(char)
+                pattern = (match.group("group") or "") + pattern[match.end() :]
+        elif pattern.startswith("(?i)"):
+            flags = "i"
+            pattern = pattern[4:]
+        return f"{prefix}(?{flags}:{pattern})"
+
+    @staticmethod
+    def may_contain_refs(text: str) -> bool:
+        """Cheap check to skip the regex for fields without any references, which are the majority."""
+        return "<" in text or "{{blob" in text
+
+    def _fname(self, match: Match[str]) -> str:
+        for group in self.fname_groups:
+            fname = match.group(group)
+            if fname is not None:
+                return fname
+        raise ValueError(match.group(0))
+
+    def _blob_id(self, match: Match[str]) -> str:
+        return self._fname(match).partition(".")[0]
+
+    def _blob_type(self, match: Match[str]) -> str:
+        """Return the media type of a referenced blob as suggested by its reference.
+
+        This is an exact type if the reference has a file extension or a type attribute,
+        or `audio/*` or `image/*` depending on the kind of reference otherwise.
+        """
+        _, dot, ext = self._fname(match).partition(".")
+        if dot:
+            mime = mimetypes.guess_type(f"file.{ext}")[0]
+            if mime:
+                return mime
+        type_match = TYPE_ATTRIBUTE_RE.search(match.group(0))
+        if type_match:
+            return type_match.group("type").lower()
+        return "audio/*" if AUDIO_REF_RE.match(match.group(0)) else "image/*"
+
+    def blob_ids(self, text: str) -> Iterator[str]:
+        """Yield the IDs of the blobs referenced in `text`, excluding remote URLs."""
+        if not self.may_contain_refs(text):
+            return
+        for match in self.regex.finditer(text):
+            blob_id = self._blob_id(match)
+            if not is_remote(blob_id):
+                yield blob_id
+
+    def blob_types(self, text: str) -> Iterator[tuple[str, str]]:
+        """Like `blob_ids()`, but yield each blob ID with its media type as suggested by the reference."""
+        if not self.may_contain_refs(text):
+            return
+        for match in self.regex.finditer(text):
+            blob_id = self._blob_id(match)
+            if not is_remote(blob_id):
+                yield blob_id, self._blob_type(match)
+
+    def rewrite(self, text: str, links: Mapping[str, str], missing: list[str]) -> str:
+        """Replace blob references in `text` with the links in `links`, keyed by blob ID.
+
+        References to blobs not in `links` are replaced with dummy image references and added to `missing`.
+        Remote URLs are left as is.
+        """
+        if not self.may_contain_refs(text):
+            return text
+
+        def repl(match: Match[str]) -> str:
+            blob_id = self._blob_id(match)
+            link = links.get(blob_id)
+            if link:
+                return link
+            if is_remote(blob_id):
+                return match.group(0)
+            missing.append(blob_id)
+            # dummy image ref
+            return f'<img src="{blob_id}.jpg"></img>'
+
+        return self.regex.sub(repl, text)
+
+    def rewrite_fields(self, fields: dict[str, str], links: Mapping[str, str], missing: list[str]) -> dict[str, str]:
+        """Return a copy of `fields` with blob references rewritten as in `rewrite()`."""
+        return {name: self.rewrite(contents, links, missing) for name, contents in fields.items()}
+
+
+# Rewriter of worker processes, set up by init_worker()
+_worker_rewriter: BlobRefRewriter | None = None
+
+
+def init_worker(patterns: Sequence[str]) -> None:
+    """Initialize a worker process, so that the patterns are only compiled once per worker."""
+    global _worker_rewriter
+    _worker_rewriter = BlobRefRewriter(patterns)
+
+
+def rewrite_fields_shard(
+    shard: list[dict[str, str]], links: Mapping[str, str]
+) -> tuple[list[dict[str, str]], list[str]]:
+    """Rewrite the fields of a shard of cards in a worker process.
+
+    Return the rewritten fields and the IDs of the missing blobs.
+    """
+    assert _worker_rewriter is not None
+    missing: list[str] = []
+    return [_worker_rewriter.rewrite_fields(fields, links, missing) for fields in shard], missing
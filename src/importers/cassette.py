@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from ..log import logger
+from .errors import CopycatImporterNotRecorded
+from .media import file_hash
+
+# Headers that carry credentials, which are never saved
+SENSITIVE_HEADERS = frozenset(
+    {
+        "authorization",
+        "cookie",
+        "set-cookie",
+        "ankiapp-client-id",
+        "ankiapp-client-token",
+    }
+)
+# Headers that don't apply to saved bodies, which are decoded
+ENCODING_HEADERS = frozenset({"content-encoding", "content-length", "transfer-encoding"})
+
+
+class HttpCassette:
+    """Recorded HTTP responses, used to reproduce imports without network access.
+
+    In record mode, the responses of successful requests are saved in `path`, keyed by method and URL.
+    Bodies are stored by content hash, so that a media file served under several URLs is stored once.
+    In replay mode, recorded responses are served instead of making requests, each after `latency` seconds.
+    """
+
+    RECORD = "record"
+    REPLAY = "replay"
+
+    def __init__(self, path: Path, mode: str, latency: float = 0.0) -> None:
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.bodies_path = path / "bodies"
+        self.index_path = path / "index.jsonl"
+        self.entries: dict[str, dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.bodies_path.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == self.REPLAY
+
+    @staticmethod
+    def key(method: str, url: str, params: Any = None) -> str:
+        if params:
+            url = requests.Request(method, url, params=params).prepare().url
+        return f"{method} {url}"
+
+    def _load(self) -> None:
+        try:
+            with open(self.index_path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Left by an interrupted recording
+                        continue
+                    self.entries[entry["key"]] = entry
+        except FileNotFoundError:
+            return
+
+    def _store_body(self, digest: str, write: Any) -> None:
+        body_path = self.bodies_path / digest
+        if body_path.exists():
+            return
+        fd, tmp_name = tempfile.mkstemp(prefix="copycat-", dir=self.bodies_path)
+        with open(fd, "wb") as file:
+            write(file)
+        Path(tmp_name).replace(body_path)
+
+    def _add(self, key: str, status_code: int, headers: dict[str, str], digest: str) -> None:
+        entry = {
+            "key": key,
+            "status_code": status_code,
+            "headers": {
+                name: value
+                for name, value in headers.items()
+                if name.lower() not in SENSITIVE_HEADERS and name.lower() not in ENCODING_HEADERS
+            },
+            "body": digest,
+        }
+        with self.lock:
+            self.entries[key] = entry
+            with open(self.index_path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(entry) + "\n")
+
+    def record_response(self, key: str, res: requests.Response) -> None:
+        body = res.content
+        digest = hashlib.sha1(body).hexdigest()
+        self._store_body(digest, lambda file: file.write(body))
+        self._add(key, res.status_code, dict(res.headers), digest)
+
+    def record_file(self, key: str, path: Path, mime: str | None) -> None:
+        """Record a response whose body was saved to `path`."""
+
+        def copy(file: Any) -> None:
+            with open(path, "rb") as source:
+                shutil.copyfileobj(source, file)
+
+        digest = file_hash(path)
+        self._store_body(digest, copy)
+        self._add(key, 200, {"Content-Type": mime} if mime else {}, digest)
+
+    def record_headers(self, key: str, headers: dict[str, str]) -> None:
+        """Record the headers of a response whose body was not read."""
+        digest = hashlib.sha1(b"").hexdigest()
+        self._store_body(digest, lambda file: None)
+        self._add(key, 200, headers, digest)
+
+    def _entry(self, key: str) -> dict[str, Any]:
+        if self.latency:
+            time.sleep(self.latency)
+        entry = self.entries.get(key)
+        if entry is None:
+            raise CopycatImporterNotRecorded(key)
+        logger.debug("replaying response", key=key)
+        return entry
+
+    def replay_response(self, key: str) -> requests.Response:
+        entry = self._entry(key)
+        res = requests.Response()
+        res.status_code = entry["status_code"]
+        res.headers = CaseInsensitiveDict(entry["headers"])
+        res.url = key.split(" ", 1)[1]
+        res.encoding = requests.utils.get_encoding_from_headers(res.headers)
+        res._content = (self.bodies_path / entry["body"]).read_bytes()
+        return res
+
+    def replay_file(self, key: str) -> tuple[Path, str | None]:
+        """Return the path of a recorded response's body and its content type."""
+        entry = self._entry(key)
+        return self.bodies_path / entry["body"], entry["headers"].get("Content-Type")
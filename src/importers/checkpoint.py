@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from ..consts import consts
+from ..log import logger
+
+
+class ImportCheckpoint:
+    """Progress of an import, persisted in the user_files folder so that a failed import can be resumed later."""
+
+    def __init__(self, importer_name: str, col_path: str) -> None:
+        self.path = consts.dir / "user_files" / f"{importer_name.lower()}_checkpoint.json"
+        self.col_path = col_path
+
+    def load(self) -> dict[str, Any] | None:
+        """Return the saved progress or `None` if there is no checkpoint for the current collection."""
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.exception("Failed to read import checkpoint", path=str(self.path))
+            return None
+        if data.get("col_path") != self.col_path:
+            return None
+        return data["progress"]
+
+    def save(self, progress: dict[str, Any]) -> None:
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"col_path": self.col_path, "progress": progress}, file)
+        tmp_path.replace(self.path)
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from anki.decks import DeckId
+
+if TYPE_CHECKING:
+    from anki.collection import Collection
+
+
+class DeckResolver:
+    """Resolve deck names to IDs, creating only the decks that don't exist yet.
+
+    The collection's deck names are loaded once, so that decks can be looked up without a backend call each.
+    """
+
+    def __init__(self, col: Collection) -> None:
+        self.col = col
+        self._ids_by_name: dict[str, DeckId] | None = None
+        # Descriptions to set on existing decks that don't have one
+        self._pending_descriptions: dict[DeckId, str] = {}
+
+    def _load(self) -> dict[str, DeckId]:
+        if self._ids_by_name is None:
+            # Deck names are case-insensitive
+            self._ids_by_name = {
+                name_and_id.name.casefold(): DeckId(name_and_id.id)
+                for name_and_id in self.col.decks.all_names_and_ids()
+            }
+        return self._ids_by_name
+
+    def get_or_add(self, name: str, description: str = "") -> DeckId:
+        """Return the ID of the deck named `name`, creating it with `description` if it doesn't exist.
+
+        Descriptions of existing decks are only set by `apply_descriptions()`, and only if they have none.
+        """
+        ids_by_name = self._load()
+        did = ids_by_name.get(name.casefold())
+        if did is None:
+            # Names that differ only in formatting from existing ones are resolved by the backend
+            did = self.col.decks.id_for_name(name)
+        if did is None:
+            deck = self.col.decks.new_deck()
+            deck.name = name
+            deck.normal.description = description
+            did = DeckId(self.col.decks.add_deck(deck).id)
+        elif description:
+            self._pending_descriptions[did] = description
+        ids_by_name[name.casefold()] = did
+        return did
+
+    def apply_descriptions(self) -> None:
+        """Set the descriptions passed to `get_or_add()` on existing decks that don't have one.
+
+        Decks are read in a single backend call, and only the decks whose description is set are written.
+        """
+        if not self._pending_descriptions:
+            return
+        deck_dicts = [
+            deck_dict
+            for deck_dict in self.col.decks.all()
+            if deck_dict["id"] in self._pending_descriptions and not deck_dict.get("desc")
+        ]
+        for deck_dict in deck_dicts:
+            deck_dict["desc"] = self._pending_descriptions[deck_dict["id"]]
+            # The backend has no call to update several decks at once
+            self.col.decks.update_dict(deck_dict)
+        self._pending_descriptions.clear()
@@ -1,4 +1,4 @@
-from requests import HTTPError
+from requests import RequestException
 
 
 class CopycatImporterError(Exception):
@@ -10,5 +10,10 @@ class CopycatImporterCanceled(CopycatImporterError):
 
 
 class CopycatImporterRequestFailed(CopycatImporterError):
-    def __init__(self, url: str, exc: HTTPError):
+    def __init__(self, url: str, exc: RequestException):
         super().__init__(f"Request to {url} failed: {str(exc)}")
+
+
+class CopycatImporterNotRecorded(CopycatImporterError):
+    def __init__(self, key: str):
+        super().__init__(f"No recorded response for {key}")
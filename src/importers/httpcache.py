@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+
+from anki.utils import checksum
+
+from ..log import logger
+
+# Response headers kept with cached bodies
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+class HttpCache:
+    """A persistent cache of response bodies that are revalidated using their ETag/Last-Modified headers.
+
+    The least recently used entries are evicted once the total size of cached bodies exceeds `max_size` bytes.
+    Callers get private links to cached bodies, so that evicting an entry never removes a file in use.
+    """
+
+    # Caches shared by all clients, keyed by folder
+    _shared: dict[Path, HttpCache] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: Path, max_size: int) -> None:
+        self.path = path
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.path.mkdir(parents=True, exist_ok=True)
+        # Links left by a previous session
+        for use_path in self.path.glob("*.use"):
+            use_path.unlink(missing_ok=True)
+        # Sizes of cached bodies by entry name, from the least to the most recently used
+        self.entries: OrderedDict[str, int] = OrderedDict()
+        body_stats = [(body_path.stem, body_path.stat()) for body_path in self.path.glob("*.body")]
+        for name, stat in sorted(body_stats, key=lambda item: item[1].st_mtime):
+            self.entries[name] = stat.st_size
+        self.size = sum(self.entries.values())
+
+    @classmethod
+    def for_path(cls, path: Path, max_size: int) -> HttpCache:
+        """Return the cache in `path` that is shared within this session.
+
+        Clients that run at the same time then share the size and order of entries,
+        and links that are still in use are only removed when the cache is first opened.
+        """
+        with cls._shared_lock:
+            if path not in cls._shared:
+                cls._shared[path] = cls(path, max_size)
+            cache = cls._shared[path]
+        with cache.lock:
+            cache.max_size = max_size
+        return cache
+
+    def _paths(self, key: str) -> tuple[Path, Path]:
+        name = checksum(key)
+        return self.path / f"{name}.json", self.path / f"{name}.body"
+
+    def get(self, key: str) -> dict[str, str] | None:
+        """Return the cached headers for `key`, or `None` if it's not cached."""
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, encoding="utf-8") as file:
+                headers = json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning("Failed to read cache entry", key=key, exc_info=True)
+            return None
+        if not body_path.exists():
+            return None
+        return headers
+
+    def conditional_headers(self, headers: dict[str, str]) -> dict[str, str]:
+        """Return the request headers needed to revalidate an entry with the given cached headers."""
+        conditional_headers = {}
+        if "ETag" in headers:
+            conditional_headers["If-None-Match"] = headers["ETag"]
+        if "Last-Modified" in headers:
+            conditional_headers["If-Modified-Since"] = headers["Last-Modified"]
+        return conditional_headers
+
+    def _link(self, body_path: Path) -> Path:
+        """Return a private link to a cached body, which the caller deletes once used."""
+        use_path = self.path / f"{body_path.stem}.{uuid.uuid4().hex}.use"
+        try:
+            os.link(body_path, use_path)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            # Hard links are not supported by all file systems
+            shutil.copyfile(body_path, use_path)
+        return use_path
+
+    def use(self, key: str) -> Path | None:
+        """Mark the entry of `key` as recently used after it was revalidated and return a private link to its body.
+
+        Returns `None` if the entry was evicted since it was looked up.
+        """
+        _, body_path = self._paths(key)
+        with self.lock:
+            try:
+                use_path = self._link(body_path)
+            except FileNotFoundError:
+                return None
+            # The modification time keeps the order of entries for later sessions
+            os.utime(body_path)
+            self.entries[body_path.stem] = self.entries.pop(body_path.stem, use_path.stat().st_size)
+        return use_path
+
+    def store(self, key: str, headers: Mapping[str, str], path: Path) -> Path | None:
+        """Move the downloaded body at `path` to the cache if it can be revalidated later.
+
+        Returns a private link to the cached body, or `None` if it was not cached.
+        """
+        cached_headers = {name: headers[name] for name in CACHED_HEADERS if name in headers}
+        if "ETag" not in cached_headers and "Last-Modified" not in cached_headers:
+            return None
+        meta_path, body_path = self._paths(key)
+        name = body_path.stem
+        size = path.stat().st_size
+        with self.lock:
+            shutil.move(str(path), body_path)
+            with open(meta_path, "w", encoding="utf-8") as file:
+                json.dump(cached_headers, file)
+            self.size += size - self.entries.pop(name, 0)
+            self.entries[name] = size
+            if self.size > self.max_size:
+                self._evict(keep=name)
+            return self._link(body_path)
+
+    def _evict(self, keep: str) -> None:
+        for name in list(self.entries):
+            if self.size <= self.max_size:
+                break
+            if name == keep:
+                continue
+            self.size -= self.entries.pop(name)
+            (self.path / f"{name}.body").unlink(missing_ok=True)
+            (self.path / f"{name}.json").unlink(missing_ok=True)
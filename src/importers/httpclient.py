@@ -1,40 +1,336 @@
+from __future__ import annotations
+
+import dataclasses
+import os
+import random
+import tempfile
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
 from typing import Any
+from urllib.parse import urlsplit
 
 import requests
+from requests.adapters import HTTPAdapter
 
-from ..consts import USER_AGENT
+from ..config import config
+from ..consts import USER_AGENT, consts
 from ..log import logger
-from .errors import CopycatImporterRequestFailed
+from .cassette import HttpCassette
+from .errors import CopycatImporterCanceled, CopycatImporterRequestFailed
+from .httpcache import HttpCache
+
+# Status codes of transient errors that are worth retrying
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class RateLimiter:
+    """A token bucket limiting the rate of requests to a single host."""
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self.tokens = rate
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a request can be made."""
+        with self.lock:
+            now = time.monotonic()
+            wait = self.paused_until - now
+            if self.rate > 0:
+                self.tokens = min(self.rate, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                # Tokens can go negative, which reserves a slot for the caller in the future
+                self.tokens -= 1
+                if self.tokens < 0:
+                    wait = max(wait, -self.tokens / self.rate)
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold all requests for `seconds`, e.g. when the server asks us to slow down."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+@dataclasses.dataclass
+class DownloadedFile:
+    """A response body saved to disk."""
+
+    path: Path
+    mime: str | None
+    # Whether the file should be deleted once used, as opposed to replayed recordings
+    temporary: bool
+
+    def read_bytes(self) -> bytes:
+        return self.path.read_bytes()
+
+    def discard(self) -> None:
+        if self.temporary:
+            self.path.unlink(missing_ok=True)
+
+
+@dataclasses.dataclass
+class PoolStats:
+    host: str
+    connections_opened: int
+    requests: int
+
+    @property
+    def connections_reused(self) -> int:
+        return self.requests - self.connections_opened
 
 
 class HttpClient:
+    """A client that is safe to share between threads.
+
+    Each thread gets its own session, but all sessions share the same per-host connection pools,
+    so connections are kept alive and reused throughout an import.
+    """
+
     timeout = 60
+    max_backoff = 60.0
+    # Maximum number of hosts to keep connection pools for
+    max_pools = 20
 
-    def __init__(self) -> None:
+    def __init__(self, pool_size: int = 10, stopped: threading.Event | None = None) -> None:
+        """`pool_size` is the number of connections kept alive per host, which should match the callers' concurrency.
+
+        If `stopped` is passed, retries and downloads are canceled with `CopycatImporterCanceled` once it's set.
+        """
         super().__init__()
-        self.session = requests.Session()
+        self.stopped = stopped
+        # Concurrency is bounded by the callers' executors, so a full pool never blocks a request.
+        # Connections opened beyond `pool_size` are closed after use.
+        self.adapter = HTTPAdapter(pool_connections=self.max_pools, pool_maxsize=pool_size, pool_block=False)
+        self._local = threading.local()
+        self.cache: HttpCache | None = None
+        if config["http_cache_size_mb"] > 0:
+            self.cache = HttpCache.for_path(
+                consts.dir / "user_files" / "http_cache", config["http_cache_size_mb"] * 1024 * 1024
+            )
+        self.max_retries: int = config["http_max_retries"]
+        self.backoff_factor: float = config["http_backoff_factor"]
+        self.requests_per_second: float = config["http_requests_per_second"]
+        self.rate_limiters: dict[str, RateLimiter] = {}
+        self.rate_limiters_lock = threading.Lock()
+        self.cassette: HttpCassette | None = None
+        if config["http_cassette_mode"] in (HttpCassette.RECORD, HttpCassette.REPLAY):
+            self.cassette = HttpCassette(
+                consts.dir / "user_files" / "http_cassette",
+                config["http_cassette_mode"],
+                config["http_cassette_latency"],
+            )
 
-    def request(self, method: str, url: str, **kwrags: Any) -> requests.Response:
-        headers = {"User-Agent": USER_AGENT}
-        headers.update(kwrags.pop("headers", {}))
-        try:
-            res = self.session.request(
-                method=method,
-                url=url,
-                timeout=self.timeout,
-                headers=headers,
-                **kwrags,
+    @property
+    def session(self) -> requests.Session:
+        """The session of the current thread."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self.adapter)
+            session.mount("http://", self.adapter)
+            self._local.session = session
+        return session
+
+    def pool_stats(self) -> list[PoolStats]:
+        """Return connection statistics of each host's pool."""
+        pools = self.adapter.poolmanager.pools
+        stats = []
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats.append(PoolStats(pool.host, pool.num_connections, pool.num_requests))
+        return stats
+
+    def log_pool_stats(self) -> None:
+        for stats in self.pool_stats():
+            logger.info(
+                "connection pool stats",
+                host=stats.host,
+                connections_opened=stats.connections_opened,
+                connections_reused=stats.connections_reused,
+                requests=stats.requests,
             )
-            res.raise_for_status()
-        except requests.HTTPError as exc:
-            raise CopycatImporterRequestFailed(url, exc) from exc
-        else:
-            log_dict: dict[str, Any] = {
-                "url": url,
-                "status_code": res.status_code,
-                "content_type": res.headers.get("Content-Type"),
-            }
-            if res.encoding == "utf-8":
-                log_dict["contents"] = res.text
-            logger.debug("request", **log_dict)
-            return res
+
+    def _rate_limiter(self, url: str) -> RateLimiter:
+        host = urlsplit(url).netloc
+        with self.rate_limiters_lock:
+            if host not in self.rate_limiters:
+                self.rate_limiters[host] = RateLimiter(self.requests_per_second)
+            return self.rate_limiters[host]
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with jitter for the given retry attempt (starting from 0)."""
+        delay = min(self.max_backoff, self.backoff_factor * 2**attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _retry_after(self, res: requests.Response) -> float | None:
+        """Parse the Retry-After header, which can be either a number of seconds or an HTTP date."""
+        value = res.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(self.max_backoff, max(0.0, seconds))
+
+    def _retry_delay(self, res: requests.Response, attempt: int, rate_limiter: RateLimiter) -> float:
+        retry_after = self._retry_after(res)
+        if retry_after is None:
+            return self._backoff(attempt)
+        # The server told us when to come back, so hold other requests to the same host too
+        rate_limiter.pause(retry_after)
+        return retry_after
+
+    def _raise_if_stopped(self) -> None:
+        if self.stopped and self.stopped.is_set():
+            raise CopycatImporterCanceled()
+
+    def _log_response(self, url: str, res: requests.Response) -> None:
+        log_dict: dict[str, Any] = {
+            "url": url,
+            "status_code": res.status_code,
+            "content_type": res.headers.get("Content-Type"),
+        }
+        if res.encoding == "utf-8":
+            log_dict["contents"] = res.text
+        logger.debug("request", **log_dict)
+
+    def _send(self, method: str, url: str, headers: dict[str, str], **kwrags: Any) -> requests.Response:
+        """Make a request, retrying on transient errors."""
+        headers = {"User-Agent": USER_AGENT, **headers}
+        rate_limiter = self._rate_limiter(url)
+        attempt = 0
+        while True:
+            rate_limiter.acquire()
+            try:
+                res = self.session.request(
+                    method=method,
+                    url=url,
+                    timeout=self.timeout,
+                    headers=headers,
+                    **kwrags,
+                )
+                if res.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    res.raise_for_status()
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                if attempt >= self.max_retries:
+                    raise CopycatImporterRequestFailed(url, exc) from exc
+                delay = self._backoff(attempt)
+                reason = str(exc)
+            except requests.HTTPError as exc:
+                # Release the connection of the failed response to the pool
+                res.close()
+                raise CopycatImporterRequestFailed(url, exc) from exc
+            else:
+                if res.status_code not in RETRY_STATUS_CODES:
+                    return res
+                res.close()
+                delay = self._retry_delay(res, attempt, rate_limiter)
+                reason = f"status code {res.status_code}"
+            attempt += 1
+            logger.warning("Retrying request", url=url, reason=reason, attempt=attempt, delay=delay)
+            if self.stopped:
+                if self.stopped.wait(delay):
+                    raise CopycatImporterCanceled()
+            else:
+                time.sleep(delay)
+
+    def request(self, method: str, url: str, **kwrags: Any) -> requests.Response:
+        cassette_key = HttpCassette.key(method, url, kwrags.get("params")) if self.cassette else ""
+        if self.cassette and self.cassette.replaying:
+            return self.cassette.replay_response(cassette_key)
+        res = self._send(method, url, kwrags.pop("headers", {}), **kwrags)
+        self._log_response(url, res)
+        if self.cassette:
+            self.cassette.record_response(cassette_key, res)
+        return res
+
+    def content_type(self, url: str, cache_key: str | None = None, **kwrags: Any) -> str | None:
+        """Return the Content-Type of the response to a GET request without downloading its body.
+
+        Unlike HEAD requests, this works with URLs that are only signed for GET requests.
+        Only the first byte is requested, so that the connection can be reused if the server supports ranges.
+        `cache_key` is used as in `download()`.
+        """
+        if cache_key and self.cache:
+            cached_headers = self.cache.get(cache_key)
+            if cached_headers:
+                return cached_headers.get("Content-Type")
+        cassette_key = HttpCassette.key("HEAD", cache_key or url, kwrags.get("params")) if self.cassette else ""
+        if self.cassette and self.cassette.replaying:
+            return self.cassette.replay_response(cassette_key).headers.get("Content-Type")
+        headers = {**kwrags.pop("headers", {}), "Range": "bytes=0-0"}
+        with self._send("GET", url, headers, stream=True, **kwrags) as res:
+            if res.status_code == 206:
+                res.raw.drain_conn()
+            content_type = res.headers.get("Content-Type")
+            if self.cassette:
+                self.cassette.record_headers(cassette_key, {"Content-Type": content_type} if content_type else {})
+        return content_type
+
+    def download(self, url: str, cache_key: str | None = None, **kwrags: Any) -> DownloadedFile:
+        """Stream the body of a GET request to disk instead of keeping it in memory.
+
+        If `cache_key` is passed and the cache is enabled, the body is cached under the key
+        and revalidated with the server on later downloads.
+        When recording or replaying responses, downloads are keyed by `cache_key` too,
+        so that signed URLs of the same file are replayed.
+        """
+        cassette_key = HttpCassette.key("GET", cache_key or url, kwrags.get("params")) if self.cassette else ""
+        if self.cassette and self.cassette.replaying:
+            path, mime = self.cassette.replay_file(cassette_key)
+            return DownloadedFile(path, mime, temporary=False)
+        downloaded_file = self._download(url, cache_key, **kwrags)
+        if self.cassette:
+            self.cassette.record_file(cassette_key, downloaded_file.path, downloaded_file.mime)
+        return downloaded_file
+
+    def _download(
+        self, url: str, cache_key: str | None = None, revalidate: bool = True, **kwrags: Any
+    ) -> DownloadedFile:
+        """Download the body of `url`, revalidating its cached body unless `revalidate` is `False`."""
+        headers = kwrags.pop("headers", {})
+        cache = self.cache if cache_key else None
+        cached_headers = cache.get(cache_key) if cache and revalidate else None
+        request_headers = {**headers, **cache.conditional_headers(cached_headers)} if cached_headers else headers
+        with self._send("GET", url, request_headers, stream=True, **kwrags) as res:
+            if cached_headers and res.status_code == 304:
+                path = cache.use(cache_key)
+                if path:
+                    logger.debug("cached response is still valid", url=url)
+                    return DownloadedFile(path, cached_headers.get("Content-Type"), temporary=True)
+                # The entry was evicted since it was looked up, so the body is requested again
+                evicted = True
+            else:
+                evicted = False
+                fd, tmp_name = tempfile.mkstemp(prefix="copycat-")
+                try:
+                    with os.fdopen(fd, "wb") as file:
+                        for chunk in res.iter_content(DOWNLOAD_CHUNK_SIZE):
+                            self._raise_if_stopped()
+                            file.write(chunk)
+                except BaseException:
+                    os.unlink(tmp_name)
+                    raise
+        if evicted:
+            # Without conditional headers, so that the server sends the body instead of another 304
+            return self._download(url, cache_key, revalidate=False, headers=headers, **kwrags)
+        logger.debug("download", url=url, status_code=res.status_code, content_type=res.headers.get("Content-Type"))
+        mime = res.headers.get("Content-Type")
+        if cache:
+            path = cache.store(cache_key, res.headers, Path(tmp_name))
+            if path:
+                return DownloadedFile(path, mime, temporary=True)
+        return DownloadedFile(Path(tmp_name), mime, temporary=True)
@@ -1,5 +1,12 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from aqt.main import AnkiQt
+
+    from .httpclient import HttpClient
 
 
 class CopycatImporter(ABC):
@@ -8,6 +15,25 @@ class CopycatImporter(ABC):
     def __init__(self, *args: Any, **kwargs: Any):
         self.warnings: list[str] = []
 
+    @classmethod
+    def can_resume(cls, mw: AnkiQt) -> bool:
+        """Whether a previous failed import can be resumed by passing `resume=True` to the constructor."""
+        return False
+
+    @classmethod
+    def media_headers(cls) -> dict[str, str]:
+        """Headers needed to download media files after the import, which are not persisted with the files."""
+        return {}
+
+    @classmethod
+    def resolve_media_urls(cls, http_client: HttpClient, sources: list[dict[str, Any]]) -> list[str | None]:
+        """Return the URLs of media files queued to be downloaded after the import, or `None` for unknown files.
+
+        `sources` are what the importer queued with each file. By default, they hold the file's URL,
+        but importers whose URLs expire queue the IDs needed to request fresh URLs instead.
+        """
+        return [source.get("url") for source in sources]
+
     @abstractmethod
     def do_import(self) -> int:
         return 0
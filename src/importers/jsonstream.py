@@ -0,0 +1,113 @@
+"""Incremental parsing of large JSON documents."""
+
+from __future__ import annotations
+
+import json
+import re
+from collections.abc import Iterator
+from typing import Any, TextIO
+
+CHUNK_SIZE = 64 * 1024
+
+WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+# Characters that can continue a number
+NUMBER_CHARS = frozenset("0123456789.eE+-")
+
+
+class JsonStreamReader:
+    """Parse a JSON document from a file one value at a time, so that large arrays don't have to be loaded at once.
+
+    Only the data that hasn't been consumed yet is buffered.
+    """
+
+    def __init__(self, file: TextIO) -> None:
+        self.file = file
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size: int = CHUNK_SIZE) -> bool:
+        """Drop consumed data and read more into the buffer. Return False at the end of the file."""
+        if self.eof:
+            return False
+        chunk = self.file.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """Skip whitespace and return the next character, or an empty string at the end of the file."""
+        while True:
+            self.pos = WHITESPACE_RE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def _error(self, expected: str) -> json.JSONDecodeError:
+        # Positions are relative to the buffer rather than the whole document
+        return json.JSONDecodeError(f"Expecting {expected}", self.buffer, self.pos)
+
+    def _expect(self, chars: str) -> str:
+        char = self._peek()
+        if not char or char not in chars:
+            raise self._error(" or ".join(repr(char) for char in chars))
+        self.pos += 1
+        return char
+
+    def read_value(self) -> Any:
+        """Parse the next value."""
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # The value may be incomplete. Read at least as much as is buffered to avoid quadratic behavior.
+                if not self._fill(max(CHUNK_SIZE, len(self.buffer))):
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk,
+            # e.g. `12.` or `1e` are decoded as 12 and 1 before `5` or `3` are read
+            if (
+                isinstance(value, (int, float))
+                and not isinstance(value, bool)
+                and (end == len(self.buffer) or self.buffer[end] in NUMBER_CHARS)
+                and self._fill()
+            ):
+                continue
+            self.pos = end
+            return value
+
+    def iter_object(self) -> Iterator[str]:
+        """Iterate over the keys of the next value, which must be an object.
+
+        The value of each key must be consumed using `read_value()`, `iter_object()` or `iter_array()`
+        before moving to the next key.
+        """
+        self._expect("{")
+        if self._peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            if not isinstance(key, str):
+                raise self._error("string")
+            self._expect(":")
+            yield key
+            if self._expect(",}") == "}":
+                return
+
+    def iter_array(self) -> Iterator[Any]:
+        """Iterate over the elements of the next value, which must be an array."""
+        self._expect("[")
+        if self._peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.read_value()
+            if self._expect(",]") == "]":
+                return
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from anki.collection import Collection
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def file_hash(path: Path) -> str:
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class MediaIndex:
+    """Index of the files in the collection's media folder, used to avoid writing duplicate media files.
+
+    Files are indexed by name and size when the folder is first used, and only hashed when a file of the same size
+    is written, so that the whole folder doesn't have to be read.
+    """
+
+    def __init__(self, col: Collection) -> None:
+        self.col = col
+        self.media_dir = Path(col.media.dir())
+        # Filenames of media imported in this run, keyed by source URL or ID
+        self.filenames: dict[str, str] = {}
+        self._names_by_size: dict[int, list[str]] | None = None
+        # Names of non-empty files, keyed by their name without extension
+        self._names_by_stem: dict[str, str] = {}
+        self._hashes: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[int, list[str]]:
+        with self._lock:
+            if self._names_by_size is None:
+                names_by_size: dict[int, list[str]] = {}
+                with os.scandir(self.media_dir) as entries:
+                    for entry in entries:
+                        if entry.is_file() and not entry.name.startswith("."):
+                            size = entry.stat().st_size
+                            names_by_size.setdefault(size, []).append(entry.name)
+                            if size:
+                                self._names_by_stem.setdefault(Path(entry.name).stem, entry.name)
+                self._names_by_size = names_by_size
+            return self._names_by_size
+
+    def _hash(self, name: str) -> str:
+        digest = self._hashes.get(name)
+        if digest is None:
+            digest = self._hashes[name] = file_hash(self.media_dir / name)
+        return digest
+
+    def find_by_id(self, media_id: str) -> str | None:
+        """Return the name of a non-empty media file named `{media_id}.*`, if any.
+
+        Importers name media files after their stable source IDs, so these files can be reused without downloading them.
+        """
+        self._load()
+        return self._names_by_stem.get(media_id)
+
+    def find_duplicate(self, path: Path) -> str | None:
+        """Return the name of a media file with the same contents as the file at `path`, if any."""
+        size = path.stat().st_size
+        candidates = self._load().get(size)
+        # Empty files are placeholders for failed downloads, which should be kept separate
+        if not size or not candidates:
+            return None
+        digest = file_hash(path)
+        for name in candidates:
+            try:
+                if self._hash(name) == digest:
+                    return name
+            except OSError:
+                continue
+        return None
+
+    def write(self, desired_name: str, path: Path) -> str:
+        """Add the file at `path` to the media folder unless an identical file exists, and return its name."""
+        existing_name = self.find_duplicate(path)
+        if existing_name:
+            return existing_name
+        data = path.read_bytes()
+        name = self.col.media.write_data(desired_name, data)
+        names_by_size = self._load()
+        if name not in names_by_size.setdefault(len(data), []):
+            names_by_size[len(data)].append(name)
+        if data:
+            self._names_by_stem.setdefault(Path(name).stem, name)
+        self._hashes[name] = hashlib.sha1(data).hexdigest()
+        return name
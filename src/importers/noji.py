@@ -1,13 +1,18 @@
 from __future__ import annotations
 
+import dataclasses
+import threading
+from collections.abc import Iterator
 from dataclasses import dataclass
 from textwrap import dedent
 from typing import TYPE_CHECKING, Any
+from urllib.parse import urlsplit
 
 import requests
 from anki.consts import MODEL_CLOZE
 from anki.decks import DeckId
 from anki.models import NotetypeDict, NotetypeId
+from anki.notes import Note
 
 if TYPE_CHECKING:
     from aqt.main import AnkiQt
@@ -16,9 +21,25 @@ from enum import Enum
 
 from ..config import config
 from ..log import logger
-from .httpclient import HttpClient
+from .backfill import MediaBackfillQueue
+from .checkpoint import ImportCheckpoint
+from .decks import DeckResolver
+from .httpclient import DownloadedFile, HttpClient
 from .importer import CopycatImporter
-from .utils import fname_to_link, guess_extension
+from .media import MediaIndex
+from .notetypes import NotetypeIndex
+from .pipeline import ImportPipeline
+from .sources import SourceMap
+from .utils import (
+    fingerprint,
+    fname_to_link,
+    guess_extension,
+    guess_url_extension,
+    guid_for,
+    imap_ordered,
+    map_concurrently,
+)
+from .writer import NoteWriter
 
 
 @dataclass
@@ -29,6 +50,24 @@ class NojiDeck:
     card_count: int
 
 
+@dataclass
+class NojiPage:
+    deck: NojiDeck
+    offset: int
+    note_dicts: dict[str, dict]
+    card_dicts: list[dict]
+    fingerprints: dict[str, str]
+    # Downloaded attachments keyed by `NojiImporter._media_key()`
+    media: dict[str, DownloadedFile | None] = dataclasses.field(default_factory=dict)
+    # Types of attachments whose downloads are deferred, keyed like `media`
+    media_types: dict[str, str | None] = dataclasses.field(default_factory=dict)
+
+    def discard_media(self) -> None:
+        for media_file in self.media.values():
+            if media_file:
+                media_file.discard()
+
+
 class NojiNotetypeKind(Enum):
     BASIC = 0
     REVERSED = 1
@@ -122,43 +161,160 @@ noji_notetypes = {
 
 class NojiImporter(CopycatImporter):
     name = "Noji"
+    api_url = "https://api-proxy-us.noji.io/api"
 
-    def __init__(self, mw: AnkiQt, token: str):
+    def __init__(self, mw: AnkiQt, token: str, resume: bool = False, incremental: bool = False):
         super().__init__()
         self.mw = mw
-        self.http_client = HttpClient()
+        # Set when the import pipeline is closed, so that requests in progress stop once the import is canceled
+        self.stopped = threading.Event()
+        self.http_client = HttpClient(
+            pool_size=max(config["media_download_concurrency"], config["noji_page_concurrency"]), stopped=self.stopped
+        )
         self.token = token
+        self.resume = resume
+        self.incremental = incremental
+        self.page_size: int = config["noji_page_size"]
+        self.checkpoint = ImportCheckpoint(self.name, self.mw.col.path)
+        self.sources = SourceMap(self.name, self.mw.col)
+        # Fingerprints of previously imported notes, keyed by Noji note ID
+        self.note_fingerprints = {cid.split("-")[0]: fp for cid, (_, fp) in self.sources.entries.items()}
+        self.note_writer = NoteWriter(
+            self.mw.col,
+            config["note_batch_size"],
+            on_flush=self._save_checkpoint,
+            source_map=self.sources,
+        )
+        self.decks: list[NojiDeck] = []
+        self.deck_resolver = DeckResolver(self.mw.col)
+        self.notetypes: dict[NojiNotetypeKind, NotetypeDict] = {}
+        self.notetype_index = NotetypeIndex(self.mw.col)
+        self.media_index = MediaIndex(self.mw.col)
+        self.defer_media = config["download_media"] and config["defer_media_downloads"]
+        self.media_backfill = MediaBackfillQueue.for_collection(self.mw.col.path)
+        self.imported_cids: set[str] = set()
+        # Keys of the attachments requested by the producer of the import pipeline
+        self.requested_media_keys: set[str] = set()
+        # Offset up to which all pages of each deck were imported
+        self.completed_offsets: dict[int, int] = {}
+        self.finished_deck_ids: set[int] = set()
+
+    @classmethod
+    def can_resume(cls, mw: AnkiQt) -> bool:
+        return ImportCheckpoint(cls.name, mw.col.path).load() is not None
+
+    def _save_checkpoint(self) -> None:
+        # Media of the written notes must be queued before the import can be resumed
+        self.media_backfill.save()
+        self.checkpoint.save(
+            {
+                "decks": [dataclasses.asdict(deck) for deck in self.decks],
+                "notetypes": {kind.name: notetype["id"] for kind, notetype in self.notetypes.items()},
+                "completed_offsets": {str(deck_id): offset for deck_id, offset in self.completed_offsets.items()},
+                "finished_deck_ids": list(self.finished_deck_ids),
+                "imported_cids": list(self.imported_cids),
+            }
+        )
+
+    def _restore_checkpoint(self) -> bool:
+        progress = self.checkpoint.load()
+        if progress is None:
+            return False
+        self.decks = [NojiDeck(**deck_dict) for deck_dict in progress["decks"]]
+        for deck in self.decks:
+            # Recreate decks the user deleted since the failed import
+            if not self.mw.col.decks.get(deck.anki_id, default=False):
+                deck.anki_id = self.deck_resolver.get_or_add(deck.name)
+        for kind_name, mid in progress["notetypes"].items():
+            notetype = self.mw.col.models.get(NotetypeId(mid))
+            if notetype:
+                self.notetypes[NojiNotetypeKind[kind_name]] = notetype
+        self.completed_offsets = {int(deck_id): offset for deck_id, offset in progress["completed_offsets"].items()}
+        self.finished_deck_ids = set(progress["finished_deck_ids"])
+        self.imported_cids = set(progress["imported_cids"])
+        return True
 
     def _get(self, url: str, *args: Any, **kwrags: Any) -> requests.Response:
         return self.http_client.request("GET", url, *args, **kwrags)
 
+    @staticmethod
+    def _auth_headers(token: str) -> dict[str, str]:
+        return {"Authorization": f"Bearer {token}"}
+
     def _api_get(self, path: str, *args: Any, **kwrags: Any) -> requests.Response:
         return self._get(
-            f"https://api-proxy-us.noji.io/api/{path}",
-            headers={"Authorization": f"Bearer {self.token}"},
+            f"{self.api_url}/{path}",
+            headers=self._auth_headers(self.token),
             *args,
             **kwrags,
         )
 
-    def _get_media(self, url: str) -> tuple[str, bytes] | None:
+    @classmethod
+    def resolve_media_urls(cls, http_client: HttpClient, sources: list[dict[str, Any]]) -> list[str | None]:
+        """Attachment URLs expire, so fresh URLs are requested from the pages of notes the attachments were found in."""
+        token = config.importer_options("ankipro").get("token", "")
+
+        def fetch_page_urls(page: tuple[int, int, int]) -> dict[str, str]:
+            deck_id, offset, limit = page
+            try:
+                data = http_client.request(
+                    "GET",
+                    f"{cls.api_url}/notes",
+                    params={"deck_id": deck_id, "limit": limit, "offset": offset},
+                    headers=cls._auth_headers(token),
+                ).json()
+            except Exception:
+                logger.warning("Failed to fetch attachment URLs", deck_id=deck_id, offset=offset, exc_info=True)
+                return {}
+            if not isinstance(data, list):
+                return {}
+            return {
+                str(id): url
+                for note_dict in data
+                for id, url in note_dict.get("fieldAttachmentUrls", {}).items()
+                if url
+            }
+
+        page_urls = map_concurrently(
+            fetch_page_urls,
+            [(source["deck_id"], source["offset"], source["limit"]) for source in sources],
+            config["noji_page_concurrency"],
+        )
+        return [
+            page_urls[(source["deck_id"], source["offset"], source["limit"])].get(str(source["attachment_id"]))
+            for source in sources
+        ]
+
+    def _media_key(self, url: str) -> str:
+        # Attachment URLs are signed, so they are identified without their query string
+        return urlsplit(url)._replace(query="", fragment="").geturl()
+
+    def _get_media(self, url: str) -> DownloadedFile | None:
         if not config["download_media"]:
             return None
         try:
-            res = self._get(url)
-            mime = res.headers.get("content-type", None)
-            if not mime:
-                return None
-            data = res.content
+            media_file = self.http_client.download(url, cache_key=self._media_key(url))
         except Exception:
             logger.exception("Failed to download media file", url=url)
             self.warnings.append(f"Failed to download media file: {url}")
             return None
-        else:
-            return mime, data
+        if not media_file.mime:
+            media_file.discard()
+            return None
+        return media_file
 
-    def _import_decks_inner(self, parent_name: str = "", params: dict[str, Any] | None = None) -> None:
-        res = self._api_get("decks", params=params)
-        data = res.json()
+    def _get_media_type(self, url: str) -> str | None:
+        try:
+            return self.http_client.content_type(url, cache_key=self._media_key(url))
+        except Exception:
+            logger.warning("Failed to get the type of media file", url=url, exc_info=True)
+            return None
+
+    def _fetch_deck_listing(self, params: dict[str, Any] | None) -> dict[str, Any]:
+        return self._api_get("decks", params=params).json()
+
+    def _add_decks(self, data: dict[str, Any], parent_name: str = "") -> None:
+        """Add the decks of a deck listing, nesting them under `parent_name` if passed."""
         decks: dict[int, NojiDeck] = {}
         for deck_dict in data.get("decks", []):
             deck = NojiDeck(
@@ -182,41 +338,43 @@ class NojiImporter(CopycatImporter):
         rewrite_deck_names(data.get("hierarchy", []), parent_name)
 
         for deck in decks.values():
-            changes = self.mw.col.decks.add_normal_deck_with_name(deck.name)
-            deck.anki_id = DeckId(changes.id)
+            deck.anki_id = self.deck_resolver.get_or_add(deck.name)
 
         self.decks.extend(decks.values())
 
     def _import_decks(self) -> None:
-        self.decks: list[NojiDeck] = []
-        self._import_decks_inner()
-
         # Import folders as parent decks
         folders = self._api_get("folders").json()
-        for folder in folders:
-            folder_id = folder["id"]
-            folder_name = folder["name"]
-            # NOTE: `parentFolderId` indicatess support for nested folders, but this is not exposed in the UI apparently
-            # parent_folder_id = folder.get("parentFolderId", None)
-            self._import_decks_inner(folder_name, {"folder_id": folder_id})
-
-    def _import_notetypes(self) -> None:
-        self.notetypes: dict[NojiNotetypeKind, NotetypeDict] = {}
-        for kind, noji_notetype in noji_notetypes.items():
-            notetype = self.mw.col.models.new(noji_notetype.name)
-            notetype["css"] = noji_notetype.css
-            if noji_notetype.is_cloze:
-                notetype["type"] = MODEL_CLOZE
-            for n, (front, back) in enumerate(noji_notetype.templates, start=1):
-                template = self.mw.col.models.new_template(f"Card {n}")
-                template["qfmt"] = front
-                template["afmt"] = back
-                self.mw.col.models.add_template(notetype, template)
-            for field_name in ("Front", "Back"):
-                field = self.mw.col.models.new_field(field_name)
-                self.mw.col.models.add_field(notetype, field)
-            changes = self.mw.col.models.add_dict(notetype)
-            self.notetypes[kind] = self.mw.col.models.get(NotetypeId(changes.id))
+        # NOTE: `parentFolderId` indicatess support for nested folders, but this is not exposed in the UI apparently
+        # parent_folder_id = folder.get("parentFolderId", None)
+        listing_params = [None, *({"folder_id": folder["id"]} for folder in folders)]
+        parent_names = ["", *(folder["name"] for folder in folders)]
+        # Listings are fetched concurrently, but decks are added in order
+        for parent_name, data in zip(
+            parent_names,
+            imap_ordered(self._fetch_deck_listing, listing_params, config["noji_page_concurrency"]),
+        ):
+            self._add_decks(data, parent_name)
+
+    def _get_notetype(self, kind: NojiNotetypeKind) -> NotetypeDict:
+        """Return the notetype for `kind`, reusing a matching notetype or adding one on first use."""
+        if kind in self.notetypes:
+            return self.notetypes[kind]
+        noji_notetype = noji_notetypes[kind]
+        notetype = self.mw.col.models.new(noji_notetype.name)
+        notetype["css"] = noji_notetype.css
+        if noji_notetype.is_cloze:
+            notetype["type"] = MODEL_CLOZE
+        for n, (front, back) in enumerate(noji_notetype.templates, start=1):
+            template = self.mw.col.models.new_template(f"Card {n}")
+            template["qfmt"] = front
+            template["afmt"] = back
+            self.mw.col.models.add_template(notetype, template)
+        for field_name in ("Front", "Back"):
+            field = self.mw.col.models.new_field(field_name)
+            self.mw.col.models.add_field(notetype, field)
+        self.notetypes[kind] = self.notetype_index.get_or_add(notetype)
+        return self.notetypes[kind]
 
     def _process_tts_map(self, side: str, tts_map: dict[str, Any]) -> str:
         tts_list = []
@@ -230,95 +388,232 @@ class NojiImporter(CopycatImporter):
 
         return "".join(tts_list)
 
-    def _import_cards_for_notes(self, deck: NojiDeck, note_dicts: dict[str, dict], imported_cids: set[str]) -> int:
-        if not note_dicts:
-            return 0
-        count = 0
+    def _fetch_page(self, deck_and_offset: tuple[NojiDeck, int]) -> NojiPage | None:
+        """Fetch a page of notes and their cards. Returns `None` if there are no more pages in the deck."""
+        deck, offset = deck_and_offset
         res = self._api_get(
-            "notes/cards",
+            "notes",
             params={
                 "deck_id": deck.id,
-                "ids": ",".join(note_dicts.keys()),
+                "limit": self.page_size,
+                "offset": offset,
             },
         )
-        card_dicts = res.json()
-        for card_dict in card_dicts:
-            try:
-                cid = card_dict["id"]
-                if cid in imported_cids:
-                    continue
-                imported_cids.add(cid)
-                note_dict = note_dicts.get(cid.split("-")[0])
-                label = card_dict.get("label", {})
-                notetype = self.notetypes[NojiNotetypeKind.type_for_string(label.get("type", ""))]
-                note = self.mw.col.new_note(notetype)
-                media_urls_map: dict[str, str] = note_dict.get("fieldAttachmentUrls", {})
-                media_side_map: dict[str, Any] = note_dict.get("fieldAttachmentsMap", {})
-                tts_map: dict[str, Any] = note_dict.get("textToSpeechMap", {})
-                media_refs_map = {}
-                for id, url in media_urls_map.items():
-                    media_info = self._get_media(url) if url else None
-                    ext = ""
-                    data = b""
-                    if media_info:
-                        mime, data = media_info
-                        ext = guess_extension(mime)
-                        if not ext:
-                            logger.warning("Unrecognized mime for media file", id=id, mime=mime)
-                            self.warnings.append(f"Unrecognized mime for media file {id}: {mime}")
+        data = res.json()
+        if not isinstance(data, list):
+            return None
+        note_dicts = {note["id"]: note for note in data}
+        # Attachment URLs are left out as they may change between requests
+        fingerprints = {
+            note_id: fingerprint({k: v for k, v in note_dict.items() if k != "fieldAttachmentUrls"})
+            for note_id, note_dict in note_dicts.items()
+        }
+        if self.incremental:
+            note_dicts = {
+                note_id: note_dict
+                for note_id, note_dict in note_dicts.items()
+                if self.note_fingerprints.get(note_id) != fingerprints[note_id]
+            }
+        card_dicts = []
+        if note_dicts:
+            res = self._api_get(
+                "notes/cards",
+                params={
+                    "deck_id": deck.id,
+                    "ids": ",".join(note_dicts.keys()),
+                },
+            )
+            card_dicts = res.json()
+        return NojiPage(deck, offset, note_dicts, card_dicts, fingerprints)
+
+    def _existing_note(self, cid: str) -> Note | None:
+        """Return the note previously imported from the card with ID `cid`, if any."""
+        source = self.sources.get(cid)
+        if not source:
+            return None
+        return self.mw.col.get_note(source[0])
+
+    def _write_media(self, page: NojiPage, media_urls_map: dict[str, str]) -> dict[str, str]:
+        """Write a note's downloaded attachments to the media folder and return a map of their IDs to media refs.
+
+        Attachments already written in this import or identical to existing media files aren't written again.
+        If media downloads are deferred, attachments are queued to be downloaded after the import instead.
+        """
+        media_refs_map = {}
+        for id, url in media_urls_map.items():
+            media_key = self._media_key(url) if url else None
+            filename = self.media_index.filenames.get(media_key) if media_key else None
+            if not filename:
+                media_file = page.media.get(media_key) if media_key else None
+                ext = ""
+                if media_file:
+                    mime = media_file.mime
+                    ext = guess_extension(mime)
                     if not ext:
-                        # Assume PNG if type is not recognized or media download fails or is disabled
-                        ext = ".png"
+                        logger.warning("Unrecognized mime for media file", id=id, mime=mime)
+                        self.warnings.append(f"Unrecognized mime for media file {id}: {mime}")
+                elif self.defer_media and url:
+                    # The file is downloaded after the import, so its type is guessed from its URL or was requested
+                    mime = page.media_types.get(media_key) if media_key else None
+                    ext = guess_url_extension(url) or (guess_extension(mime) if mime else None)
+                if not ext:
+                    # Assume PNG if type is not recognized or media download fails or is disabled
+                    ext = ".png"
+                if media_file and media_key:
+                    filename = self.media_index.write(f"{id}{ext}", media_file.path)
+                    self.media_index.filenames[media_key] = filename
+                elif self.defer_media and media_key:
                     filename = f"{id}{ext}"
-                    filename = self.mw.col.media.write_data(filename, data)
-                    media_refs_map[str(id)] = fname_to_link(filename)
-
-                for i, side in enumerate(("front", "back")):
-                    contents = ""
-                    media_ids = [t["id"] if isinstance(t, dict) else t for t in media_side_map.get(f"{side}_side", [])]
-                    if media_ids:
-                        contents += "<br>".join(
-                            media_refs_map[str(id)] for id in media_ids if str(id) in media_refs_map
-                        )
-                    contents += self._process_tts_map(side, tts_map)
-                    contents += card_dict["fields"][f"{side}_side"]
-                    note.fields[i] = contents
-            except Exception as exc:
-                logger.warning(
-                    "unexpected error while parsing note in deck %s: exc=%s, note=%s",
-                    deck.id,
-                    str(exc),
-                    card_dict,
-                )
-                raise
-            self.mw.col.add_note(note, deck.anki_id)
-            count += 1
-        return count
+                    # Attachment URLs expire, so they're requested again from the page when the file is downloaded
+                    source = {
+                        "deck_id": page.deck.id,
+                        "offset": page.offset,
+                        "limit": self.page_size,
+                        "attachment_id": id,
+                    }
+                    self.media_backfill.add(filename, self.name, source, cache_key=media_key)
+                    self.media_index.filenames[media_key] = filename
+                else:
+                    filename = self.mw.col.media.write_data(f"{id}{ext}", b"")
+            media_refs_map[str(id)] = fname_to_link(filename)
+        return media_refs_map
+
+    def _download_page_media(self, page: NojiPage) -> None:
+        # Download all attachments of the page up front instead of one by one while building notes
+        # Attachments already requested in this run or present in the media folder are reused.
+        # Their URLs are signed differently in each request, so they're told apart by their keys.
+        media_urls: dict[str, str] = {}
+        deferred_urls: dict[str, str] = {}
+        for note_dict in page.note_dicts.values():
+            for id, url in note_dict.get("fieldAttachmentUrls", {}).items():
+                if not url:
+                    continue
+                media_key = self._media_key(url)
+                if media_key in self.requested_media_keys or media_key in self.media_index.filenames:
+                    continue
+                self.requested_media_keys.add(media_key)
+                existing_name = self.media_index.find_by_id(str(id))
+                if existing_name:
+                    self.media_index.filenames[media_key] = existing_name
+                    continue
+                if not self.defer_media:
+                    media_urls[media_key] = url
+                elif not guess_url_extension(url):
+                    deferred_urls[media_key] = url
+        media = map_concurrently(self._get_media, list(media_urls.values()), config["media_download_concurrency"])
+        page.media = {media_key: media[url] for media_key, url in media_urls.items()}
+        # The types of deferred attachments are requested without downloading them
+        media_types = map_concurrently(
+            self._get_media_type, list(deferred_urls.values()), config["media_download_concurrency"]
+        )
+        page.media_types = {media_key: media_types[url] for media_key, url in deferred_urls.items()}
+
+    def _import_cards_for_notes(self, page: NojiPage) -> int:
+        try:
+            return sum(self._import_card(page, card_dict) for card_dict in page.card_dicts)
+        finally:
+            page.discard_media()
+
+    def _import_card(self, page: NojiPage, card_dict: dict) -> bool:
+        """Import a single card. Returns `False` if the card was already imported."""
+        deck = page.deck
+        try:
+            cid = card_dict["id"]
+            if cid in self.imported_cids:
+                return False
+            note_id = cid.split("-")[0]
+            note_dict = page.note_dicts.get(note_id)
+            label = card_dict.get("label", {})
+            notetype = self._get_notetype(NojiNotetypeKind.type_for_string(label.get("type", "")))
+            existing_note = self._existing_note(cid) if self.incremental else None
+            note = existing_note
+            if not note:
+                note = self.mw.col.new_note(notetype)
+                note.guid = guid_for(self.name, deck.id, cid)
+            media_side_map: dict[str, Any] = note_dict.get("fieldAttachmentsMap", {})
+            tts_map: dict[str, Any] = note_dict.get("textToSpeechMap", {})
+            media_refs_map = self._write_media(page, note_dict.get("fieldAttachmentUrls", {}))
+            for i, side in enumerate(("front", "back")):
+                contents = ""
+                media_ids = [t["id"] if isinstance(t, dict) else t for t in media_side_map.get(f"{side}_side", [])]
+                if media_ids:
+                    contents += "<br>".join(media_refs_map[str(id)] for id in media_ids if str(id) in media_refs_map)
+                contents += self._process_tts_map(side, tts_map)
+                contents += card_dict["fields"][f"{side}_side"]
+                note.fields[i] = contents
+        except Exception as exc:
+            logger.warning(
+                "unexpected error while parsing note in deck %s: exc=%s, note=%s",
+                deck.id,
+                str(exc),
+                card_dict,
+            )
+            raise
+        self.imported_cids.add(cid)
+        if existing_note:
+            self.note_writer.update(note, cid, page.fingerprints[note_id])
+        else:
+            self.note_writer.add(note, deck.anki_id, cid, page.fingerprints[note_id])
+        return True
+
+    def _fetch_pages(self, pages_to_fetch: list[tuple[NojiDeck, int]]) -> Iterator[tuple[NojiDeck, NojiPage | None]]:
+        """Fetch pages with their attachments, yielding `None` pages for decks with no more pages."""
+        finished_deck_ids: set[int] = set()
+        for (deck, _), page in zip(
+            pages_to_fetch,
+            imap_ordered(self._fetch_page, pages_to_fetch, config["noji_page_concurrency"]),
+        ):
+            if deck.id in finished_deck_ids:
+                continue
+            if page is None:
+                finished_deck_ids.add(deck.id)
+            elif page.note_dicts:
+                self._download_page_media(page)
+            yield deck, page
+
+    def _discard_fetched_page(self, record: tuple[NojiDeck, NojiPage | None]) -> None:
+        _, page = record
+        if page:
+            page.discard_media()
 
     def _import_cards(self) -> int:
-        limit = 20
         count = 0
-        imported_cids: set[str] = set()
-        for deck in self.decks:
-            offset = 0
-            while offset < deck.card_count:
-                res = self._api_get(
-                    "notes",
-                    params={
-                        "deck_id": deck.id,
-                        "limit": limit,
-                        "offset": offset,
-                    },
-                )
-                data = res.json()
-                if not isinstance(data, list):
-                    break
-                note_dicts = {note["id"]: note for note in data}
-                count += self._import_cards_for_notes(deck, note_dicts, imported_cids)
-                offset += limit
+        # All page offsets are known in advance from the deck's card count,
+        # so pages are fetched concurrently and then imported in order
+        pages_to_fetch = [
+            (deck, offset)
+            for deck in self.decks
+            if deck.id not in self.finished_deck_ids
+            for offset in range(self.completed_offsets.get(deck.id, 0), deck.card_count, self.page_size)
+        ]
+        # Pages are fetched in the background while fetched pages are written to the collection
+        pipeline = ImportPipeline(
+            self._fetch_pages(pages_to_fetch),
+            config["import_queue_size"],
+            discard=self._discard_fetched_page,
+            stopped=self.stopped,
+        )
+        try:
+            with pipeline:
+                for deck, page in pipeline:
+                    if page is None:
+                        self.finished_deck_ids.add(deck.id)
+                        continue
+                    count += self._import_cards_for_notes(page)
+                    self.completed_offsets[deck.id] = page.offset + self.page_size
+        finally:
+            self.note_writer.flush()
+            self._save_checkpoint()
+            self.sources.save()
         return count
 
     def do_import(self) -> int:
-        self._import_decks()
-        self._import_notetypes()
-        return self._import_cards()
+        try:
+            if not (self.resume and self._restore_checkpoint()):
+                self._import_decks()
+            self._save_checkpoint()
+            count = self._import_cards()
+        finally:
+            self.http_client.log_pool_stats()
+        self.checkpoint.clear()
+        return count
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from anki.models import NotetypeDict, NotetypeId
+
+from ..log import logger
+from .utils import fingerprint
+
+if TYPE_CHECKING:
+    from anki.collection import Collection
+
+
+def notetype_fingerprint(notetype: NotetypeDict) -> str:
+    """Return a fingerprint of the fields, templates and styling of `notetype`, ignoring its name and ID."""
+    return fingerprint(
+        {
+            "type": notetype["type"],
+            "fields": [field["name"] for field in notetype["flds"]],
+            "templates": [(template["name"], template["qfmt"], template["afmt"]) for template in notetype["tmpls"]],
+            "css": notetype["css"],
+        }
+    )
+
+
+class NotetypeIndex:
+    """Index of the collection's notetypes by content, used to reuse notetypes added by previous imports.
+
+    Adding a notetype is a schema change, which requires a one-way full sync.
+    """
+
+    def __init__(self, col: Collection) -> None:
+        self.col = col
+        self._ids_by_fingerprint: dict[str, list[NotetypeId]] | None = None
+
+    def _load(self) -> dict[str, list[NotetypeId]]:
+        if self._ids_by_fingerprint is None:
+            self._ids_by_fingerprint = {}
+            for name_and_id in self.col.models.all_names_and_ids():
+                notetype = self.col.models.get(NotetypeId(name_and_id.id))
+                if notetype:
+                    self._ids_by_fingerprint.setdefault(notetype_fingerprint(notetype), []).append(notetype["id"])
+        return self._ids_by_fingerprint
+
+    def find(self, notetype: NotetypeDict) -> NotetypeDict | None:
+        """Return a notetype of the collection with the same content as `notetype`.
+
+        Notetypes with the same name are preferred.
+        """
+        matches = [
+            match
+            for mid in self._load().get(notetype_fingerprint(notetype), [])
+            if (match := self.col.models.get(mid)) is not None
+        ]
+        for match in matches:
+            if match["name"] == notetype["name"]:
+                return match
+        return matches[0] if matches else None
+
+    def get_or_add(self, notetype: NotetypeDict) -> NotetypeDict:
+        """Return a notetype of the collection with the same content as `notetype`, adding `notetype` if none exists."""
+        existing = self.find(notetype)
+        if existing:
+            logger.debug("reusing notetype", name=existing["name"], id=existing["id"])
+            return existing
+        changes = self.col.models.add_dict(notetype)
+        added = self.col.models.get(NotetypeId(changes.id))
+        assert added is not None
+        self._load().setdefault(notetype_fingerprint(added), []).append(added["id"])
+        return added
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import queue
+import threading
+from collections.abc import Iterable, Iterator
+from typing import Any, Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+# Marks the end of the records in the queue
+_DONE = object()
+
+
+class _ProducerFailed:
+    def __init__(self, exc: BaseException) -> None:
+        self.exc = exc
+
+
+class ImportPipeline(Generic[T]):
+    """Produce records in a background thread and consume them in the calling thread.
+
+    The producer thread iterates `records`, which is meant to do the network I/O of an import
+    and yield records that are ready to be written to the collection.
+    The calling thread, which owns the collection, writes records as they come.
+    At most `max_pending` records are queued, so the producer waits when writing falls behind.
+
+    Exceptions raised while producing records are re-raised in the calling thread.
+    If the consumer stops early, the producer is stopped too, and `discard`, if passed,
+    is called on records that were produced but not consumed, e.g. to delete their temporary files.
+    `stopped`, if passed, is the event that is set when the pipeline is closed,
+    so that the producer's HTTP client can cancel its requests too.
+    """
+
+    # How often a blocked producer checks whether the pipeline was closed
+    poll_interval = 0.1
+
+    def __init__(
+        self,
+        records: Iterable[T],
+        max_pending: int,
+        discard: Callable[[T], None] | None = None,
+        stopped: threading.Event | None = None,
+    ) -> None:
+        self.records = records
+        self.discard = discard
+        self.queue: queue.Queue[Any] = queue.Queue(maxsize=max(1, max_pending))
+        self.stopped = stopped or threading.Event()
+        self.thread = threading.Thread(target=self._produce, name="copycat-import-producer", daemon=True)
+
+    def _put(self, item: Any) -> bool:
+        """Queue `item`, waiting for space. Returns `False` if the pipeline was closed in the meantime."""
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=self.poll_interval)
+            except queue.Full:
+                continue
+            return True
+        return False
+
+    def _produce(self) -> None:
+        iterator = iter(self.records)
+        try:
+            for record in iterator:
+                if not self._put(record):
+                    if self.discard:
+                        self.discard(record)
+                    return
+            self._put(_DONE)
+        except BaseException as exc:
+            self._put(_ProducerFailed(exc))
+        finally:
+            # Generators are closed in the thread that runs them, so that their cleanup code runs here
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+
+    def __iter__(self) -> Iterator[T]:
+        self.thread.start()
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, _ProducerFailed):
+                    raise item.exc
+                yield item
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Stop the producer and discard records that weren't consumed."""
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if self.discard and item is not _DONE and not isinstance(item, _ProducerFailed):
+                self.discard(item)
+
+    def __enter__(self) -> ImportPipeline[T]:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING
+
+from anki.notes import NoteId
+from anki.utils import checksum
+
+from ..consts import consts
+from ..log import logger
+
+if TYPE_CHECKING:
+    from anki.collection import Collection
+
+
+class SourceMap:
+    """Mapping of source IDs to the notes imported from them and a fingerprint of their source content.
+
+    Used to update previously imported notes in place instead of importing them again.
+    """
+
+    def __init__(self, importer_name: str, col: Collection) -> None:
+        self.path = consts.dir / "user_files" / f"{importer_name.lower()}_sources_{checksum(col.path)[:8]}.json"
+        self.entries: dict[str, tuple[NoteId, str]] = {}
+        self._load(col)
+
+    def _load(self, col: Collection) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logger.exception("Failed to read source map", path=str(self.path))
+            return
+        # Forget notes that were deleted since they were imported
+        existing_nids = set(col.db.list("select id from notes"))
+        self.entries = {
+            source_id: (NoteId(nid), fingerprint)
+            for source_id, (nid, fingerprint) in data.items()
+            if nid in existing_nids
+        }
+
+    def get(self, source_id: str) -> tuple[NoteId, str] | None:
+        """Return the ID of the note imported from `source_id` and the fingerprint of its source content."""
+        return self.entries.get(source_id)
+
+    def set(self, source_id: str, nid: NoteId, fingerprint: str) -> None:
+        self.entries[source_id] = (nid, fingerprint)
+
+    def save(self) -> None:
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self.entries, file)
+        tmp_path.replace(self.path)
@@ -1,10 +1,22 @@
 from __future__ import annotations
 
 import html
+import itertools
+import json
 import mimetypes
 import urllib
+from collections import deque
+from collections.abc import Generator, Hashable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import PurePosixPath
+from typing import Any, Callable, TypeVar
 
 import aqt
+from anki.utils import base91, checksum
+
+T = TypeVar("T")
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
 
 # https://github.com/ankitects/anki/blob/a58b2a986ceebbf7d5d863dfa5acf206b0c2ab02/qt/aqt/editor.py#L836
 
@@ -17,6 +29,16 @@ def fname_to_link(fname: str) -> str:
     return f"[sound:{html.escape(fname, quote=False)}]"
 
 
+def fingerprint(obj: Any) -> str:
+    """Return a stable hash of a JSON-serializable object."""
+    return checksum(json.dumps(obj, sort_keys=True, ensure_ascii=False))
+
+
+def guid_for(*parts: Any) -> str:
+    """Return a note GUID derived from `parts`, so that notes imported from the same source get the same GUID."""
+    return base91(int(checksum("|".join(str(part) for part in parts))[:16], 16))
+
+
 def guess_extension(mime: str) -> str | None:
     # Work around guess_extension() not recognizing some file types
     extensions_for_mimes = {
@@ -36,3 +58,61 @@ def guess_extension(mime: str) -> str | None:
             return None
 
     return ext
+
+
+def guess_url_extension(url: str) -> str | None:
+    """Return the extension of the file at `url` if it's a known media file extension."""
+    ext = PurePosixPath(urllib.parse.urlsplit(url).path).suffix.lower()
+    if ext and mimetypes.guess_type(f"file{ext}")[0]:
+        return ext
+    return None
+
+
+def map_concurrently(func: Callable[[K], V], items: Iterable[K], max_workers: int) -> dict[K, V]:
+    """Call `func` on each unique item using a pool of at most `max_workers` threads.
+
+    Returns a dict mapping each item to its result.
+    """
+    unique_items = list(dict.fromkeys(items))
+    if max_workers <= 1 or len(unique_items) <= 1:
+        return {item: func(item) for item in unique_items}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(unique_items))) as executor:
+        return dict(zip(unique_items, executor.map(func, unique_items)))
+
+
+def imap_ordered(
+    func: Callable[[T], V],
+    items: Iterable[T],
+    max_workers: int,
+    discard: Callable[[V], None] | None = None,
+) -> Generator[V, None, None]:
+    """Like `map(func, items)`, but run up to `max_workers` calls ahead of the consumer in a thread pool.
+
+    Results are yielded in the order of `items` regardless of completion order.
+    If the consumer stops early, `discard`, if passed, is called on results that were computed ahead but not yielded.
+    """
+    if max_workers <= 1:
+        yield from map(func, items)
+        return
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending: deque[Future[V]] = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) > max_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if discard:
+            for future in pending:
+                if not future.cancelled() and future.exception() is None:
+                    discard(future.result())
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    """Split `items` into lists of `size` items. The last list may be shorter."""
+    iterator = iter(items)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Callable
+
+from anki.collection import AddNoteRequest
+from anki.utils import guid64
+
+if TYPE_CHECKING:
+    from anki.collection import Collection
+    from anki.decks import DeckId
+    from anki.notes import Note
+
+    from .sources import SourceMap
+
+
+class NoteWriter:
+    """Buffer new and updated notes and save them to the collection in batches."""
+
+    def __init__(
+        self,
+        col: Collection,
+        batch_size: int,
+        on_flush: Callable[[], None] | None = None,
+        source_map: SourceMap | None = None,
+    ) -> None:
+        self.col = col
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self.source_map = source_map
+        self.pending: list[AddNoteRequest] = []
+        self.pending_updates: list[Note] = []
+        # Source IDs and fingerprints to record in the source map once notes are saved
+        self.pending_sources: list[tuple[str, str, Note]] = []
+        self.added_count = 0
+        self.updated_count = 0
+        self._used_guids: set[str] | None = None
+
+    def add(self, note: Note, deck_id: DeckId, source_id: str | None = None, fingerprint: str = "") -> None:
+        if self._used_guids is None:
+            self._used_guids = set(self.col.db.list("select guid from notes"))
+        if note.guid in self._used_guids:
+            # The source was imported before, so fall back to a random GUID to keep GUIDs unique
+            note.guid = guid64()
+        self._used_guids.add(note.guid)
+        self.pending.append(AddNoteRequest(note=note, deck_id=deck_id))
+        self._add_source(note, source_id, fingerprint)
+
+    def update(self, note: Note, source_id: str | None = None, fingerprint: str = "") -> None:
+        self.pending_updates.append(note)
+        self._add_source(note, source_id, fingerprint)
+
+    def _add_source(self, note: Note, source_id: str | None, fingerprint: str) -> None:
+        if source_id is not None:
+            self.pending_sources.append((source_id, fingerprint, note))
+        if len(self.pending) + len(self.pending_updates) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Save all buffered notes to the collection."""
+        if not self.pending and not self.pending_updates:
+            return
+        requests, self.pending = self.pending, []
+        updates, self.pending_updates = self.pending_updates, []
+        sources, self.pending_sources = self.pending_sources, []
+        if requests:
+            self.col.add_notes(requests)
+            self.added_count += len(requests)
+        if updates:
+            self.col.update_notes(updates)
+            self.updated_count += len(updates)
+        if self.source_map:
+            for source_id, fingerprint, note in sources:
+                self.source_map.set(source_id, note.id, fingerprint)
+        if self.on_flush:
+            self.on_flush()
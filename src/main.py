@@ -4,6 +4,7 @@ patch_certifi()
 
 # ruff: noqa: E402
 from .backend.server import init_server
+from .backfill import setup_media_backfill
 from .errors import setup_error_handler
 from .menu import add_menu
 
@@ -11,4 +12,5 @@ from .menu import add_menu
 def init() -> None:
     setup_error_handler()
     add_menu()
+    setup_media_backfill()
     init_server()
@@ -0,0 +1,90 @@
+"""Micro-benchmark of AlgoApp media reference rewriting.
+
+Run with `just bench` or `python tests/benchmarks/bench_blob_refs.py [number_of_fields]`.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import random
+import re
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+from re import Match
+
+# Load the module directly, as importing the add-on package requires a running Anki instance
+spec = importlib.util.spec_from_file_location(
+    "blobrefs", Path(__file__).parents[2] / "src" / "importers" / "blobrefs.py"
+)
+assert spec and spec.loader
+blobrefs = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(blobrefs)
+
+# Anki's MediaManager.html_media_regexps
+ANKI_MEDIA_PATTERNS = (
+    r"(?i)(<(?:img|audio|source)\b[^>]* src=(?P<str>[\"'])(?P<fname>[^>]+?)(?P=str)[^>]*>)",
+    r"(?i)(<(?:img|audio|source)\b[^>]* src=(?!['\"])(?P<fname>[^ >]+)[^>]*?>)",
+    r"(?i)(<object\b[^>]* data=(?P<str>[\"'])(?P<fname>[^>]+?)(?P=str)[^>]*>)",
+    r"(?i)(<object\b[^>]* data=(?!['\"])(?P<fname>[^ >]+)[^>]*?>)",
+)
+PATTERNS = (*ANKI_MEDIA_PATTERNS, *blobrefs.ALGOAPP_BLOB_REF_PATTERNS)
+
+
+def make_fields(count: int, blob_ids: list[str]) -> list[str]:
+    rng = random.Random(0)
+    words = "the quick brown fox jumps over the lazy dog".split()
+    fields = []
+    for _ in range(count):
+        text = " ".join(rng.choices(words, k=rng.randint(2, 30)))
+        kind = rng.random()
+        if kind < 0.1:
+            text += f" {{{{blob {rng.choice(blob_ids)}}}}}"
+        elif kind < 0.2:
+            text += f' <img id="{rng.choice(blob_ids)}" />'
+        elif kind < 0.25:
+            text = f"<b>{text}</b>"
+        fields.append(text)
+    return fields
+
+
+def sequential_rewrite(patterns: list[re.Pattern[str]], links: dict[str, str]) -> Callable[[str], str]:
+    """The previous implementation, which applied each pattern in turn."""
+
+    def repl(match: Match[str]) -> str:
+        blob_id = match.group("fname").partition(".")[0]
+        return links.get(blob_id) or f'<img src="{blob_id}.jpg"></img>'
+
+    def rewrite(text: str) -> str:
+        for pattern in patterns:
+            text = pattern.sub(repl, text)
+        return text
+
+    return rewrite
+
+
+def bench(name: str, func: Callable[[str], str], fields: list[str]) -> list[str]:
+    start = time.perf_counter()
+    results = [func(field) for field in fields]
+    elapsed = time.perf_counter() - start
+    print(f"{name:>12}: {len(fields) / elapsed:,.0f} fields/sec")
+    return results
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    blob_ids = [f"blob{i}" for i in range(1000)]
+    links = {blob_id: f'<img src="{blob_id}.png">' for blob_id in blob_ids}
+    fields = make_fields(count, blob_ids)
+
+    sequential = sequential_rewrite([re.compile(p) for p in PATTERNS], links)
+    rewriter = blobrefs.BlobRefRewriter(PATTERNS)
+    missing: list[str] = []
+    expected = bench("sequential", sequential, fields)
+    results = bench("single pass", lambda text: rewriter.rewrite(text, links, missing), fields)
+    assert results == expected
+
+
+if __name__ == "__main__":
+    main()
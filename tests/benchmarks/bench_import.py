@@ -0,0 +1,86 @@
+"""End-to-end benchmarks of Noji and AlgoApp imports into a temporary collection, using a local stand-in of their APIs.
+
+Run with `just bench-import` or `python -m pytest tests/benchmarks/bench_import.py -s --no-cov`.
+The numbers of cards to import are set with `BENCH_SCALES`, e.g. `BENCH_SCALES=1000,10000,100000`,
+the number of media files per card with `BENCH_MEDIA_RATIO` and the delay of each response in seconds
+with `BENCH_LATENCY`.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import tracemalloc
+from typing import Any, Callable
+
+import pytest
+
+from tests.fixtures import MockMainWindow
+
+from .standin import AccountSpec, StandinServer
+
+SCALES = [int(scale) for scale in os.environ.get("BENCH_SCALES", "1000").split(",")]
+MEDIA_RATIO = float(os.environ.get("BENCH_MEDIA_RATIO", "0.1"))
+LATENCY = float(os.environ.get("BENCH_LATENCY", "0"))
+
+# Downloads are not cached, so that each run fetches everything
+BENCH_CONFIG = {"http_cache_size_mb": 0, "http_max_retries": 0}
+
+
+@pytest.fixture
+def addon_config() -> dict[str, Any]:
+    """Used by the `mw` fixture of the tests' conftest."""
+    return BENCH_CONFIG
+
+
+def run_import(label: str, server: StandinServer, make_importer: Callable[[], Any]) -> int:
+    importer = make_importer()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        count = importer.do_import()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    print(
+        f"\n{label}: {count} cards in {elapsed:.2f}s ({count / elapsed:.0f} cards/s), "
+        f"{server.total_requests} requests, peak Python memory {peak / 1024 / 1024:.1f} MB"
+    )
+    for endpoint, requests in sorted(server.requests.items()):
+        print(f"  {endpoint}: {requests}")
+    return count
+
+
+@pytest.mark.parametrize("cards", SCALES)
+def test_noji_import(mw: MockMainWindow, cards: int) -> None:
+    # Imported once the main window that the add-on's config is read through is set up
+    from src.importers.noji import NojiImporter  # noqa: PLC0415
+
+    spec = AccountSpec(cards=cards, media=int(cards * MEDIA_RATIO), latency=LATENCY)
+    with StandinServer(spec) as server:
+
+        def make_importer() -> NojiImporter:
+            importer = NojiImporter(mw, token="token")  # type: ignore
+            importer.api_url = server.noji_api_url
+            return importer
+
+        count = run_import(f"Noji, {cards} cards", server, make_importer)
+    assert count == cards
+
+
+@pytest.mark.parametrize("cards", SCALES)
+def test_algoapp_import(mw: MockMainWindow, cards: int) -> None:
+    from src.importers.algoapp import AlgoAppImporter  # noqa: PLC0415
+
+    spec = AccountSpec(cards=cards, media=int(cards * MEDIA_RATIO), latency=LATENCY)
+    with StandinServer(spec) as server:
+
+        def make_importer() -> AlgoAppImporter:
+            importer = AlgoAppImporter(mw, client_id="id", client_token="token", client_version="1")  # type: ignore
+            importer.api_url = server.algoapp_api_url
+            importer.blobs_url = server.algoapp_blobs_url
+            return importer
+
+        count = run_import(f"AlgoApp, {cards} cards", server, make_importer)
+    assert count == cards
@@ -0,0 +1,238 @@
+"""A local stand-in for the Noji and AlgoApp APIs that serves a synthetic account, for offline benchmarks.
+
+Noji endpoints are served under `/noji/api` and AlgoApp endpoints under `/algoapp/api`,
+with media files under `/noji/media` and `/algoapp/blobs`.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+Response = tuple[int, str, bytes]
+
+
+@dataclasses.dataclass
+class AccountSpec:
+    """Size of the synthetic account."""
+
+    cards: int = 1000
+    decks: int = 10
+    # Number of media files, each attached to a different note, starting from the first note
+    media: int = 100
+    media_size: int = 20 * 1024
+    # Delay in seconds before each response
+    latency: float = 0.0
+
+
+class StandinServer:
+    """Serve a synthetic account generated from `spec` on a local port, counting the requests of each endpoint."""
+
+    def __init__(self, spec: AccountSpec) -> None:
+        self.spec = spec
+        self.requests: Counter[str] = Counter()
+        self.lock = threading.Lock()
+        # Number of cards of each deck, and the index of the first card of each deck in the account
+        base, extra = divmod(spec.cards, spec.decks)
+        self.deck_sizes = [base + (1 if i < extra else 0) for i in range(spec.decks)]
+        self.deck_starts = [sum(self.deck_sizes[:i]) for i in range(spec.decks)]
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="standin-server", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    @property
+    def noji_api_url(self) -> str:
+        return f"{self.url}/noji/api"
+
+    @property
+    def algoapp_api_url(self) -> str:
+        return f"{self.url}/algoapp/api"
+
+    @property
+    def algoapp_blobs_url(self) -> str:
+        return f"{self.url}/algoapp/blobs"
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+    def __enter__(self) -> StandinServer:
+        self.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep connections alive like the real APIs
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                body = self.do_HEAD()
+                self.wfile.write(body)
+
+            def do_HEAD(self) -> bytes:
+                status, content_type, body = server.handle(self.path)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                return body
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        return Handler
+
+    def handle(self, path: str) -> Response:
+        if self.spec.latency:
+            time.sleep(self.spec.latency)
+        parts = urlsplit(path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        segments = parts.path.strip("/").split("/")
+        # Endpoints are counted without their IDs
+        endpoint = "/".join("{id}" if any(char.isdigit() for char in segment) else segment for segment in segments)
+        with self.lock:
+            self.requests[endpoint] += 1
+        try:
+            if segments[:2] == ["noji", "api"]:
+                return self._noji_api(segments[2:], query)
+            if segments[:2] == ["noji", "media"]:
+                return self._media(segments[2].split(".")[0])
+            if segments[:2] == ["algoapp", "api"]:
+                return self._algoapp_api(segments[2:])
+            if segments[:2] == ["algoapp", "blobs"]:
+                return self._media(segments[2])
+        except (IndexError, KeyError, ValueError):
+            return 400, "text/plain", b"Bad request"
+        return 404, "text/plain", b"Not found"
+
+    def _json(self, data: Any) -> Response:
+        return 200, "application/json", json.dumps(data).encode("utf-8")
+
+    def _media(self, media_id: str) -> Response:
+        # Files are unique, so that they're not deduplicated
+        filler = media_id.encode("utf-8") * (self.spec.media_size // max(len(media_id), 1) + 1)
+        return 200, "image/png", PNG_HEADER + filler[: self.spec.media_size]
+
+    def _media_index(self, deck_index: int, card_index: int) -> int | None:
+        """Return the index of the media file attached to a card, if any."""
+        index = self.deck_starts[deck_index] + card_index
+        return index if index < self.spec.media else None
+
+    def _noji_deck_dict(self, deck_index: int) -> dict[str, Any]:
+        return {"id": deck_index + 1, "name": f"Deck {deck_index + 1}", "totalCardsCount": self.deck_sizes[deck_index]}
+
+    def _noji_note_id(self, deck_index: int, card_index: int) -> str:
+        return f"d{deck_index + 1}n{card_index}"
+
+    def _noji_api(self, segments: list[str], query: dict[str, str]) -> Response:
+        if segments == ["folders"]:
+            return self._json([{"id": 1, "name": "Folder"}])
+        if segments == ["decks"]:
+            # Decks with odd IDs are in the folder
+            in_folder = "folder_id" in query
+            deck_dicts = [self._noji_deck_dict(i) for i in range(self.spec.decks) if bool((i + 1) % 2) == in_folder]
+            return self._json(
+                {"decks": deck_dicts, "hierarchy": [{"id": deck["id"], "children": []} for deck in deck_dicts]}
+            )
+        if segments == ["notes"]:
+            deck_index = int(query["deck_id"]) - 1
+            offset = int(query["offset"])
+            end = min(offset + int(query["limit"]), self.deck_sizes[deck_index])
+            return self._json([self._noji_note(deck_index, i) for i in range(offset, end)])
+        if segments == ["notes", "cards"]:
+            deck_index = int(query["deck_id"]) - 1
+            return self._json(
+                [
+                    {
+                        "id": f"{note_id}-0",
+                        "label": {"type": "basic"},
+                        "fields": {"front_side": f"Front of {note_id}", "back_side": f"Back of {note_id}"},
+                    }
+                    for note_id in query["ids"].split(",")
+                    if note_id.startswith(f"d{deck_index + 1}n")
+                ]
+            )
+        return 404, "text/plain", b"Not found"
+
+    def _noji_note(self, deck_index: int, card_index: int) -> dict[str, Any]:
+        note: dict[str, Any] = {"id": self._noji_note_id(deck_index, card_index)}
+        media_index = self._media_index(deck_index, card_index)
+        if media_index is not None:
+            media_id = 1000 + media_index
+            note["fieldAttachmentsMap"] = {"front_side": [media_id]}
+            # Attachment URLs are signed differently on each request
+            note["fieldAttachmentUrls"] = {
+                str(media_id): f"{self.url}/noji/media/{media_id}.png?signature={time.monotonic_ns()}"
+            }
+        return note
+
+    def _algoapp_api(self, segments: list[str]) -> Response:
+        if segments == ["decks"]:
+            return self._json(
+                {
+                    "user": [
+                        {"id": f"deck{i + 1}", "name": f"Deck {i + 1}", "description": ""}
+                        for i in range(self.spec.decks)
+                    ],
+                    "share": [],
+                    "subscriptions": [],
+                }
+            )
+        if len(segments) == 2 and segments[0] == "decks":
+            deck_index = int(segments[1].removeprefix("deck")) - 1
+            return self._json(self._algoapp_deck(deck_index))
+        return 404, "text/plain", b"Not found"
+
+    def _algoapp_deck(self, deck_index: int) -> dict[str, Any]:
+        knols = []
+        for card_index in range(self.deck_sizes[deck_index]):
+            front = f"Front of knol {card_index}"
+            media_index = self._media_index(deck_index, card_index)
+            if media_index is not None:
+                front += f" {{{{blob blob{media_index:06d}}}}}"
+            knols.append(
+                {
+                    "id": f"d{deck_index + 1}k{card_index}",
+                    "values": {"Front": front, "Back": f"Back of knol {card_index}"},
+                    "tags": [],
+                }
+            )
+        # Layouts come before knols, so that knols are parsed incrementally
+        return {
+            "layouts": [
+                {
+                    "id": f"layout{deck_index + 1}",
+                    "name": "Basic",
+                    "knol_keys": ["Front", "Back"],
+                    "style": "",
+                    "templates": ["{{[Front]}}", "{{[Back]}}"],
+                }
+            ],
+            "knols": knols,
+        }
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import threading
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable
+
+import pytest
+from anki.collection import Collection
+
+from tests.fixtures import MockMainWindow
+
+# Nothing is cached in the add-on's folder by tests that don't set up a cache of their own
+TEST_CONFIG = {"http_cache_size_mb": 0}
+
+# Starts a local server answering requests with the given handler class, and returns its base URL
+ServeFunc = Callable[[type[BaseHTTPRequestHandler]], str]
+
+
+@pytest.fixture
+def addon_config() -> dict[str, Any]:
+    """Config values that override the add-on's defaults in `mw`. Modules can override this fixture."""
+    return TEST_CONFIG
+
+
+@pytest.fixture
+def mw(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, addon_config: dict[str, Any]) -> Iterator[MockMainWindow]:
+    """A main window with a temporary collection, which the add-on's config is read through.
+
+    Modules that read the config must be imported after this fixture is set up.
+    Files that the add-on saves in its folder are saved in a temporary folder instead.
+    """
+    aqt = pytest.importorskip("aqt")
+    mw = MockMainWindow(str(tmp_path / "collection.anki2"), addon_config)
+    aqt.mw = mw
+    from src.consts import consts  # noqa: PLC0415
+
+    addon_dir = tmp_path / "addon"
+    (addon_dir / "user_files").mkdir(parents=True)
+    monkeypatch.setattr(consts, "dir", addon_dir)
+    try:
+        yield mw
+    finally:
+        mw.col.close()
+        aqt.mw = None
+
+
+@pytest.fixture
+def col(tmp_path: Path) -> Iterator[Collection]:
+    """A temporary collection, for tests of modules that don't read the add-on's config."""
+    col = Collection(str(tmp_path / "collection.anki2"))
+    try:
+        yield col
+    finally:
+        col.close()
+
+
+@pytest.fixture
+def serve() -> Iterator[ServeFunc]:
+    """Start local HTTP servers, which are stopped after the test."""
+    servers: list[tuple[ThreadingHTTPServer, threading.Thread]] = []
+
+    def start(handler: type[BaseHTTPRequestHandler]) -> str:
+        httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        httpd.daemon_threads = True
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        servers.append((httpd, thread))
+        host, port = httpd.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    try:
+        yield start
+    finally:
+        for httpd, thread in servers:
+            httpd.shutdown()
+            httpd.server_close()
+            thread.join()
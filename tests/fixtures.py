@@ -1,7 +1,13 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
 from typing import Any
 
 from anki.collection import Collection
 
+CONFIG_PATH = Path(__file__).parents[1] / "src" / "config.json"
+
 
 class MockTaskman:
     def run_on_main(self, *args: Any, **kwargs: Any) -> None:
@@ -17,14 +23,18 @@ class MockProgress:
 
 
 class MockAddonManager:
+    def __init__(self, config: dict[str, Any] | None = None) -> None:
+        self.defaults = json.loads(CONFIG_PATH.read_text(encoding="utf-8"))
+        self.config = {**self.defaults, **(config or {})}
+
     def addonFromModule(self, *args: Any, **kwargs: Any) -> Any:
         return "copycat_importer"
 
     def getConfig(self, *args: Any, **kwargs: Any) -> Any:
-        return {}
+        return self.config
 
     def addonConfigDefaults(self, *args: Any, **kwargs: Any) -> Any:
-        return {}
+        return self.defaults
 
     def setConfigUpdatedAction(self, *args: Any, **kwargs: Any) -> None:
         pass
@@ -39,8 +49,8 @@ class MockMainWindow:
     taskman: MockTaskman
     addonManager: MockAddonManager
 
-    def __init__(self, col_path: str) -> None:
+    def __init__(self, col_path: str, config: dict[str, Any] | None = None) -> None:
         self.col = Collection(col_path)
         self.progress = MockProgress()
         self.taskman = MockTaskman()
-        self.addonManager = MockAddonManager()
+        self.addonManager = MockAddonManager(config)
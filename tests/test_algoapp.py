@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from tests.fixtures import MockMainWindow
+
+
+def test_rewrite_fields_in_worker_processes(mw: MockMainWindow) -> None:
+    from src.importers.algoapp import AlgoAppCard, AlgoAppDeck, AlgoAppImporter  # noqa: PLC0415
+
+    importer = AlgoAppImporter(mw, client_id="id", client_token="token", client_version="1")  # type: ignore
+    importer.field_processes = 2
+    importer.field_shard_size = 2
+    importer.media_links = {"blob1": '<img src="blob1.png">'}
+    deck = AlgoAppDeck(ID="deck", name="Deck", description="")
+    cards = [AlgoAppCard("layout", deck, {"Front": f"{{{{blob blob{i % 2 + 1}}}}}"}, []) for i in range(5)]
+    try:
+        importer._rewrite_fields(cards, ["blob1", "blob2"])
+        # The pool was not dropped in favor of rewriting fields in this process
+        assert importer.field_executor is not None
+        assert importer.field_processes == 2
+    finally:
+        importer._shutdown_field_executor()
+    assert [card.fields["Front"] for card in cards[:2]] == ['<img src="blob1.png">', '<img src="blob2.jpg"></img>']
+    assert importer.warnings.count("Missing media file: blob2") == 2
+
+
+def test_deferred_media_extensions(mw: MockMainWindow) -> None:
+    from src.importers.algoapp import AlgoAppImporter  # noqa: PLC0415
+
+    importer = AlgoAppImporter(mw, client_id="id", client_token="token", client_version="1")  # type: ignore
+    # Types are requested from a server that can't be reached
+    importer.blobs_url = "http://127.0.0.1:9"
+    importer.http_client.max_retries = 0
+    importer.defer_media = True
+    importer._download_media({"a": "audio/mpeg", "b": "audio/*", "c": "image/*", "d": "image/jpeg"})
+    assert [filename for filename, _ in importer.media_backfill.items()] == ["a.mp3", "b.mp3", "c.png", "d.jpg"]
+    assert importer.media_links["b"] == "[sound:b.mp3]"
+
+
+def test_field_names_are_unique_case_insensitively(mw: MockMainWindow) -> None:
+    from src.importers.algoapp import FieldSet  # noqa: PLC0415
+
+    fields = FieldSet(["Front", "front", "Back"])
+    assert "FRONT" in fields
+    assert "Extra" not in fields
+    # Names are looked up as added
+    assert fields.get("Front") == "Front"
+    assert fields.get("front") == "front+"
+    assert fields.get("FRONT") is None
+    assert list(fields) == ["Front", "front+", "Back"]
+    fields.discard("Front")
+    assert "FRONT" in fields
+    fields.discard("front")
+    assert "FRONT" not in fields
+    assert fields.folded_keys == {"back": 1}
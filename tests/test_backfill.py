@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import threading
+import time
+from pathlib import Path
+
+from tests.benchmarks.standin import PNG_HEADER, AccountSpec, StandinServer
+from tests.fixtures import MockMainWindow
+
+
+def test_backfill_writes_queued_files(mw: MockMainWindow, tmp_path: Path) -> None:
+    from src.importers.algoapp import AlgoAppImporter  # noqa: PLC0415
+    from src.importers.backfill import MediaBackfill, MediaBackfillQueue  # noqa: PLC0415
+
+    queue = MediaBackfillQueue(mw.col.path)
+    queue.path = tmp_path / "queue.json"
+    with StandinServer(AccountSpec(media_size=100)) as server:
+        for i in range(5):
+            queue.add(f"blob{i}.png", AlgoAppImporter.name, {"url": f"{server.algoapp_blobs_url}/blob{i}"})
+        # Files whose URLs can't be resolved stay in the queue for later attempts
+        queue.add("unknown.png", "Unknown", {"id": "unknown"})
+        backfill = MediaBackfill(mw.col, queue, {AlgoAppImporter.name: AlgoAppImporter})
+        backfill.chunk_size = 2
+        progress: list[int] = []
+        written = backfill.run(lambda processed, total: progress.append(processed))
+    assert written == 5
+    assert progress == [1, 2, 3, 4, 5, 6]
+    media_dir = Path(mw.col.media.dir())
+    assert all((media_dir / f"blob{i}.png").stat().st_size == len(PNG_HEADER) + 100 for i in range(5))
+    assert [filename for filename, _ in queue.items()] == ["unknown.png"]
+    assert queue.items()[0][1]["attempts"] == 1
+
+
+def test_backfill_stops_between_chunks(mw: MockMainWindow, tmp_path: Path) -> None:
+    from src.importers.algoapp import AlgoAppImporter  # noqa: PLC0415
+    from src.importers.backfill import MediaBackfill, MediaBackfillQueue  # noqa: PLC0415
+
+    queue = MediaBackfillQueue(mw.col.path)
+    queue.path = tmp_path / "queue.json"
+    with StandinServer(AccountSpec(media_size=100)) as server:
+        for i in range(6):
+            queue.add(f"blob{i}.png", AlgoAppImporter.name, {"url": f"{server.algoapp_blobs_url}/blob{i}"})
+        backfill = MediaBackfill(mw.col, queue, {AlgoAppImporter.name: AlgoAppImporter})
+        backfill.chunk_size = 2
+
+        def on_progress(processed: int, total: int) -> None:
+            if processed == 2:
+                backfill.stop()
+
+        written = backfill.run(on_progress)
+    assert written == 2
+    # The remaining files are saved for the next session
+    assert queue.path.exists()
+    assert len(queue) == 4
+
+
+def test_stop_doesnt_wait_for_downloads(mw: MockMainWindow, tmp_path: Path) -> None:
+    from src.importers.algoapp import AlgoAppImporter  # noqa: PLC0415
+    from src.importers.backfill import MediaBackfill, MediaBackfillQueue  # noqa: PLC0415
+
+    queue = MediaBackfillQueue(mw.col.path)
+    queue.path = tmp_path / "queue.json"
+    with StandinServer(AccountSpec(media_size=100, latency=1)) as server:
+        for i in range(3):
+            queue.add(f"blob{i}.png", AlgoAppImporter.name, {"url": f"{server.algoapp_blobs_url}/blob{i}"})
+        backfill = MediaBackfill(mw.col, queue, {AlgoAppImporter.name: AlgoAppImporter})
+        results: list[int] = []
+        thread = threading.Thread(target=lambda: results.append(backfill.run()))
+        thread.start()
+        time.sleep(0.2)
+        start = time.monotonic()
+        backfill.stop()
+        assert time.monotonic() - start < 0.5
+        thread.join()
+    assert results == [0]
+    assert len(queue) == 3
+    assert not any(Path(mw.col.media.dir()).iterdir())
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from src.importers.blobrefs import ALGOAPP_BLOB_REF_PATTERNS, BlobRefRewriter, init_worker, rewrite_fields_shard
+
+LINKS = {"blob1": '<img src="blob1.png">'}
+
+
+def test_rewrite_fields_in_worker_process() -> None:
+    # Workers import the add-on's package without a main window, as they do in Anki
+    with ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(ALGOAPP_BLOB_REF_PATTERNS,),
+    ) as executor:
+        shard = [{"Front": "{{blob blob1}}", "Back": "{{blob blob2}}"}]
+        fields, missing = executor.submit(rewrite_fields_shard, shard, LINKS).result(timeout=60)
+    assert fields == [{"Front": '<img src="blob1.png">', "Back": '<img src="blob2.jpg"></img>'}]
+    assert missing == ["blob2"]
+
+
+def test_blob_types() -> None:
+    rewriter = BlobRefRewriter(
+        [
+            r"(?i)(<(?:img|audio|source)\b[^>]* src=(?P<str>[\"'])(?P<fname>[^>]+?)(?P=str)[^>]*>)",
+            *ALGOAPP_BLOB_REF_PATTERNS,
+        ]
+    )
+    text = (
+        '{{blob a}} {{blob b.mp3}} <audio id="c" type="audio/mpeg" /> <audio id=d> <img id="e"> '
+        '<source src="f"> <img src="g.jpg"> <img src="https://example.com/h.png">'
+    )
+    assert list(rewriter.blob_types(text)) == [
+        ("a", "image/*"),
+        ("b", "audio/mpeg"),
+        ("c", "audio/mpeg"),
+        ("d", "audio/*"),
+        ("e", "image/*"),
+        ("f", "audio/*"),
+        ("g", "image/jpeg"),
+    ]
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import json
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from tests.conftest import ServeFunc
+from tests.fixtures import MockMainWindow
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """Serve a JSON document that sets a cookie, and the same media file under every path in /media."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        if self.path.startswith("/media/"):
+            body = b"media"
+            content_type = "image/png"
+        else:
+            body = json.dumps({"path": self.path}).encode()
+            content_type = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Set-Cookie", "session=secret")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+def test_record_and_replay(mw: MockMainWindow, tmp_path: Path, serve: ServeFunc) -> None:
+    from src.importers.cassette import HttpCassette  # noqa: PLC0415
+    from src.importers.errors import CopycatImporterNotRecorded  # noqa: PLC0415
+    from src.importers.httpclient import HttpClient  # noqa: PLC0415
+
+    url = serve(ApiHandler)
+    client = HttpClient()
+    client.cassette = HttpCassette(tmp_path / "cassette", HttpCassette.RECORD)
+    res = client.request("GET", f"{url}/api/decks", params={"page": 1}, headers={"Authorization": "Bearer secret"})
+    assert res.json() == {"path": "/api/decks?page=1"}
+    for path in ("/media/1?signature=a", "/media/2?signature=a"):
+        media_file = client.download(url + path, cache_key=url + path.split("?")[0])
+        media_file.discard()
+
+    # Both media files have the same body, which is stored once
+    assert len(list((tmp_path / "cassette" / "bodies").iterdir())) == 2
+    index = (tmp_path / "cassette" / "index.jsonl").read_text(encoding="utf-8")
+    assert "secret" not in index
+
+    # Replayed by a client whose requests would fail
+    client = HttpClient()
+    client.cassette = HttpCassette(tmp_path / "cassette", HttpCassette.REPLAY)
+    client.adapter = None  # type: ignore
+    res = client.request("GET", f"{url}/api/decks", params={"page": 1})
+    assert res.json() == {"path": "/api/decks?page=1"}
+    # Signed URLs are replayed by their cache keys
+    media_file = client.download(f"{url}/media/1?signature=b", cache_key=f"{url}/media/1")
+    assert media_file.read_bytes() == b"media"
+    assert media_file.mime == "image/png"
+    media_file.discard()
+    # Replayed files are kept for later replays
+    assert media_file.path.exists()
+    with pytest.raises(CopycatImporterNotRecorded):
+        client.download(f"{url}/media/3?signature=b", cache_key=f"{url}/media/3")
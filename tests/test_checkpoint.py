@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from tests.benchmarks.standin import AccountSpec, StandinServer
+from tests.fixtures import MockMainWindow
+
+PROGRESS = {"completed_offsets": {"1": 20}, "imported_cids": ["a-0", "b-0"]}
+
+
+def test_checkpoint_round_trip(mw: MockMainWindow) -> None:
+    from src.importers.checkpoint import ImportCheckpoint  # noqa: PLC0415
+
+    checkpoint = ImportCheckpoint("Noji", mw.col.path)
+    assert checkpoint.load() is None
+    checkpoint.save(PROGRESS)
+    assert ImportCheckpoint("Noji", mw.col.path).load() == PROGRESS
+    # Checkpoints only apply to the collection they were saved for
+    assert ImportCheckpoint("Noji", "other.anki2").load() is None
+    checkpoint.clear()
+    assert checkpoint.load() is None
+
+
+def test_corrupt_checkpoint_is_ignored(mw: MockMainWindow) -> None:
+    from src.importers.checkpoint import ImportCheckpoint  # noqa: PLC0415
+
+    checkpoint = ImportCheckpoint("Noji", mw.col.path)
+    checkpoint.path.write_text('{"col_path": ', encoding="utf-8")
+    assert checkpoint.load() is None
+
+
+def test_resume_failed_noji_import(mw: MockMainWindow, monkeypatch: pytest.MonkeyPatch) -> None:
+    from src.importers.noji import NojiImporter  # noqa: PLC0415
+
+    import_page = NojiImporter._import_cards_for_notes
+    imported_pages = 0
+
+    def fail_on_third_page(self: NojiImporter, page: Any) -> int:
+        nonlocal imported_pages
+        if imported_pages == 2:
+            raise ConnectionError
+        imported_pages += 1
+        return import_page(self, page)
+
+    with StandinServer(AccountSpec(cards=30, decks=2, media=0)) as server:
+        monkeypatch.setattr(NojiImporter, "api_url", server.noji_api_url)
+        monkeypatch.setattr(NojiImporter, "_import_cards_for_notes", fail_on_third_page)
+        importer = NojiImporter(mw, token="token")  # type: ignore
+        importer.page_size = 5
+        with pytest.raises(ConnectionError):
+            importer.do_import()
+        assert mw.col.note_count() == 10
+        assert NojiImporter.can_resume(mw)  # type: ignore
+
+        monkeypatch.setattr(NojiImporter, "_import_cards_for_notes", import_page)
+        importer = NojiImporter(mw, token="token", resume=True)  # type: ignore
+        importer.page_size = 5
+        assert importer.do_import() == 20
+        # Decks are not listed again
+        assert server.requests["noji/api/decks"] == 2
+    assert mw.col.note_count() == 30
+    assert not NojiImporter.can_resume(mw)  # type: ignore
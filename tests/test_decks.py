@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from anki.collection import Collection
+
+from src.importers.decks import DeckResolver
+
+
+def test_decks_are_resolved_case_insensitively(col: Collection) -> None:
+    existing_did = col.decks.id("Existing")
+    resolver = DeckResolver(col)
+    assert resolver.get_or_add("existing") == existing_did
+    new_did = resolver.get_or_add("New", "New description")
+    assert resolver.get_or_add("NEW") == new_did
+    deck_dict = col.decks.get(new_did)
+    assert deck_dict
+    assert deck_dict["desc"] == "New description"
+
+
+def test_descriptions_are_only_set_on_decks_without_one(col: Collection) -> None:
+    described_did = col.decks.id("Described")
+    deck_dict = col.decks.get(described_did)
+    assert deck_dict
+    deck_dict["desc"] = "Kept"
+    col.decks.update_dict(deck_dict)
+    empty_did = col.decks.id("Empty")
+    resolver = DeckResolver(col)
+    resolver.get_or_add("Described", "Imported")
+    resolver.get_or_add("Empty", "Imported")
+    resolver.apply_descriptions()
+    assert [col.decks.get(did)["desc"] for did in (described_did, empty_did)] == ["Kept", "Imported"]  # type: ignore
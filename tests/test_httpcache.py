@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Any
+
+from tests.conftest import ServeFunc
+from tests.fixtures import MockMainWindow
+
+HEADERS = {"Content-Type": "image/png", "ETag": '"1"'}
+
+
+def write_body(path: Path, size: int) -> Path:
+    path.write_bytes(b"x" * size)
+    return path
+
+
+def test_eviction_keeps_files_in_use(mw: MockMainWindow, tmp_path: Path) -> None:
+    from src.importers.httpcache import HttpCache  # noqa: PLC0415
+
+    cache = HttpCache(tmp_path / "cache", max_size=150)
+    first = cache.store("first", HEADERS, write_body(tmp_path / "first", 100))
+    assert first
+    # Evicts the first entry
+    second = cache.store("second", HEADERS, write_body(tmp_path / "second", 100))
+    assert second
+    assert cache.get("first") is None
+    assert cache.get("second") == HEADERS
+    assert first.read_bytes() == b"x" * 100
+    assert cache.size == 100
+
+
+def test_eviction_order(mw: MockMainWindow, tmp_path: Path) -> None:
+    from src.importers.httpcache import HttpCache  # noqa: PLC0415
+
+    cache = HttpCache(tmp_path / "cache", max_size=250)
+    for key in ("first", "second"):
+        path = cache.store(key, HEADERS, write_body(tmp_path / key, 100))
+        assert path
+        path.unlink()
+    used = cache.use("first")
+    assert used
+    cache.store("third", HEADERS, write_body(tmp_path / "third", 100))
+    assert cache.get("first") == HEADERS
+    assert cache.get("second") is None
+    # The order is kept for later sessions, and links left by this one are removed
+    cache = HttpCache(tmp_path / "cache", max_size=250)
+    assert list(cache.entries) == [cache._paths(key)[1].stem for key in ("first", "third")]
+    assert not used.exists()
+
+
+def test_cache_is_shared_by_path(mw: MockMainWindow, tmp_path: Path) -> None:
+    from src.importers.httpcache import HttpCache  # noqa: PLC0415
+
+    cache = HttpCache.for_path(tmp_path / "cache", max_size=1024)
+    used = cache.store("first", HEADERS, write_body(tmp_path / "first", 100))
+    assert used
+    # A client created while the link is in use doesn't remove it
+    assert HttpCache.for_path(tmp_path / "cache", max_size=1024) is cache
+    assert used.read_bytes() == b"x" * 100
+
+
+class VersionedHandler(BaseHTTPRequestHandler):
+    """Serve a body whose ETag is its version, answering conditional requests with 304 if it didn't change."""
+
+    protocol_version = "HTTP/1.1"
+    version = 1
+    statuses: list[int] = []
+
+    def do_GET(self) -> None:
+        etag = f'"{self.version}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.statuses.append(304)
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        body = f"version {self.version}".encode()
+        self.statuses.append(200)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+def test_downloads_are_revalidated(mw: MockMainWindow, tmp_path: Path, serve: ServeFunc) -> None:
+    from src.importers.httpcache import HttpCache  # noqa: PLC0415
+    from src.importers.httpclient import HttpClient  # noqa: PLC0415
+
+    handler = type("Handler", (VersionedHandler,), {"statuses": []})
+    url = serve(handler) + "/file"
+    client = HttpClient()
+    client.cache = HttpCache(tmp_path / "cache", max_size=1024 * 1024)
+
+    def download() -> bytes:
+        media_file = client.download(url, cache_key=url)
+        assert media_file.mime == "text/plain"
+        try:
+            return media_file.read_bytes()
+        finally:
+            media_file.discard()
+
+    assert download() == b"version 1"
+    assert download() == b"version 1"
+    assert handler.statuses == [200, 304]
+    handler.version = 2
+    assert download() == b"version 2"
+    assert handler.statuses == [200, 304, 200]
+    # Requested again if the entry is evicted between its lookup and the response
+    client.cache.use = lambda key: None  # type: ignore
+    assert download() == b"version 2"
+    assert handler.statuses == [200, 304, 200, 304, 200]
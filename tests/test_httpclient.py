@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from typing import Any, Union
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from tests.conftest import ServeFunc
+from tests.fixtures import MockMainWindow
+
+
+class ForbiddenHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        body = b"Forbidden"
+        self.send_response(403)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+def test_failed_downloads_release_connections(mw: MockMainWindow, serve: ServeFunc) -> None:
+    # Imported once the main window that the add-on's config is read through is set up
+    from src.importers.errors import CopycatImporterRequestFailed  # noqa: PLC0415
+    from src.importers.httpclient import HttpClient  # noqa: PLC0415
+
+    forbidden_url = serve(ForbiddenHandler) + "/file"
+    pool_size = 2
+    client = HttpClient(pool_size=pool_size)
+    failures = []
+
+    def download_all() -> None:
+        for _ in range(pool_size * 3):
+            try:
+                client.download(forbidden_url)
+            except CopycatImporterRequestFailed as exc:
+                failures.append(exc)
+
+    thread = threading.Thread(target=download_all, daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), "downloads are stuck waiting for a connection"
+    assert len(failures) == pool_size * 3
+
+
+# A response's status code and headers, or an exception to raise
+StubResponse = Union[tuple[int, dict[str, str]], Exception]
+
+
+class StubAdapter(BaseAdapter):
+    """Answer requests with queued responses, keeping the responses that were sent."""
+
+    def __init__(self, responses: list[StubResponse]) -> None:
+        super().__init__()
+        self.responses = responses
+        self.sent: list[requests.Response] = []
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        status_code, headers = response
+        res = requests.Response()
+        res.status_code = status_code
+        res.headers = CaseInsensitiveDict(headers)
+        res.raw = io.BytesIO(b"body")
+        res.url = request.url or ""
+        res.request = request
+        self.sent.append(res)
+        return res
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def sleeps(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    """Record sleeps instead of sleeping."""
+    sleeps: list[float] = []
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    return sleeps
+
+
+def stub_client(responses: list[StubResponse]) -> Any:
+    from src.importers.httpclient import HttpClient  # noqa: PLC0415
+
+    client = HttpClient()
+    client.adapter = StubAdapter(responses)
+    client.max_retries = 2
+    client.requests_per_second = 0
+    return client
+
+
+def test_retry_then_success(mw: MockMainWindow, sleeps: list[float]) -> None:
+    client = stub_client([(503, {}), requests.ConnectionError(), (200, {})])
+    media_file = client.download("https://example.com")
+    assert media_file.read_bytes() == b"body"
+    media_file.discard()
+    assert len(sleeps) == 2
+    # Responses that are retried are closed
+    assert client.adapter.sent[0].raw.closed
+
+
+def test_retry_exhaustion(mw: MockMainWindow, sleeps: list[float]) -> None:
+    from src.importers.errors import CopycatImporterRequestFailed  # noqa: PLC0415
+
+    client = stub_client([(503, {}), (502, {}), (500, {})])
+    with pytest.raises(CopycatImporterRequestFailed):
+        client.download("https://example.com")
+    assert len(client.adapter.sent) == 3
+    assert all(res.raw.closed for res in client.adapter.sent)
+
+
+def test_retry_after_is_honored_and_capped(mw: MockMainWindow, sleeps: list[float]) -> None:
+    client = stub_client([(429, {"Retry-After": "3"}), (429, {"Retry-After": "3600"}), (200, {})])
+    client.max_backoff = 10.0
+    client.request("GET", "https://example.com")
+    # Other sleeps are the rate limiter holding requests for the same time
+    assert [delay for delay in sleeps if delay in (3, 10)] == [3, 10]
+    assert max(sleeps) <= 10
+
+
+def test_client_errors_are_not_retried(mw: MockMainWindow, sleeps: list[float]) -> None:
+    from src.importers.errors import CopycatImporterRequestFailed  # noqa: PLC0415
+
+    client = stub_client([(404, {}), (200, {})])
+    with pytest.raises(CopycatImporterRequestFailed):
+        client.download("https://example.com")
+    assert len(client.adapter.sent) == 1
+    assert client.adapter.sent[0].raw.closed
+    assert not sleeps
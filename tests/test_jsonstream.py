@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import io
+import json
+from typing import Any
+
+import pytest
+
+from src.importers.jsonstream import JsonStreamReader
+
+DOCUMENTS = [
+    '{"a": 12.5, "b": [1e3, -0.25E-2, 10, 0, true, false, null, "x\\"y"], "c": {"d": 123456, "e": []}, "f": {}}',
+    "[12.5, 1e+30, -7, 3.0e-2, 99]",
+    "  -1234.5e-3  ",
+]
+
+
+class SplitIO(io.StringIO):
+    """Return the first `split` characters on the first read, then one character at a time."""
+
+    def __init__(self, text: str, split: int) -> None:
+        super().__init__(text)
+        self.split = split
+
+    def read(self, size: int | None = -1) -> str:
+        if self.split:
+            size, self.split = self.split, 0
+            return super().read(size)
+        return super().read(1)
+
+
+def read_document(reader: JsonStreamReader) -> Any:
+    """Read a document using the incremental methods for objects and arrays."""
+    char = reader._peek()
+    if char == "{":
+        return {key: read_document(reader) for key in reader.iter_object()}
+    if char == "[":
+        return list(reader.iter_array())
+    return reader.read_value()
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_values_split_at_every_position(document: str) -> None:
+    expected = json.loads(document)
+    for split in range(len(document) + 1):
+        assert JsonStreamReader(SplitIO(document, split)).read_value() == expected, split
+        assert read_document(JsonStreamReader(SplitIO(document, split))) == expected, split
+
+
+def test_incomplete_number_at_end_of_file() -> None:
+    with pytest.raises(json.JSONDecodeError):
+        list(JsonStreamReader(SplitIO("[1, 2.", 0)).iter_array())
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from anki.collection import Collection
+
+from src.importers.media import MediaIndex
+
+
+def downloaded_file(tmp_path: Path, name: str, data: bytes) -> Path:
+    path = tmp_path / name
+    path.write_bytes(data)
+    return path
+
+
+def test_files_of_the_same_size_are_compared_by_contents(col: Collection, tmp_path: Path) -> None:
+    col.media.write_data("existing.png", b"aaaa")
+    index = MediaIndex(col)
+    other = downloaded_file(tmp_path, "other", b"bbbb")
+    assert index.find_duplicate(other) is None
+    assert index.write("other.png", other) == "other.png"
+    assert (Path(col.media.dir()) / "other.png").read_bytes() == b"bbbb"
+
+
+def test_duplicates_are_not_written_again(col: Collection, tmp_path: Path) -> None:
+    col.media.write_data("existing.png", b"aaaa")
+    index = MediaIndex(col)
+    duplicate = downloaded_file(tmp_path, "duplicate", b"aaaa")
+    assert index.find_duplicate(duplicate) == "existing.png"
+    assert index.write("duplicate.png", duplicate) == "existing.png"
+    assert not (Path(col.media.dir()) / "duplicate.png").exists()
+    # Files written by the index are found too
+    written = downloaded_file(tmp_path, "written", b"cccc")
+    assert index.write("written.png", written) == "written.png"
+    assert index.find_duplicate(downloaded_file(tmp_path, "copy", b"cccc")) == "written.png"
+
+
+def test_files_are_found_by_id(col: Collection, tmp_path: Path) -> None:
+    col.media.write_data("1000.jpg", b"aaaa")
+    # Placeholders of failed downloads
+    col.media.write_data("1001.png", b"")
+    index = MediaIndex(col)
+    assert index.find_by_id("1000") == "1000.jpg"
+    assert index.find_by_id("1001") is None
+    assert index.find_by_id("1002") is None
+    index.write("1002.mp3", downloaded_file(tmp_path, "1002", b"bbbb"))
+    assert index.find_by_id("1002") == "1002.mp3"
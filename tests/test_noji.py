@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import pytest
+
+from tests.benchmarks.standin import AccountSpec, StandinServer
+from tests.fixtures import MockMainWindow
+
+
+def test_resolve_media_urls(mw: MockMainWindow, monkeypatch: pytest.MonkeyPatch) -> None:
+    from src.importers.httpclient import HttpClient  # noqa: PLC0415
+    from src.importers.noji import NojiImporter  # noqa: PLC0415
+
+    with StandinServer(AccountSpec(cards=20, decks=2, media=5)) as server:
+        monkeypatch.setattr(NojiImporter, "api_url", server.noji_api_url)
+        sources = [
+            {"deck_id": 1, "offset": 0, "limit": 2, "attachment_id": 1001},
+            {"deck_id": 1, "offset": 0, "limit": 2, "attachment_id": 1000},
+            {"deck_id": 1, "offset": 2, "limit": 2, "attachment_id": 1002},
+            # Not in the page anymore
+            {"deck_id": 1, "offset": 0, "limit": 2, "attachment_id": 1004},
+        ]
+        urls = NojiImporter.resolve_media_urls(HttpClient(), sources)
+        # Both attachments of the first page are resolved with a single request
+        assert server.requests["noji/api/notes"] == 2
+    assert [url.split("?")[0].rsplit("/", 1)[1] if url else None for url in urls] == [
+        "1001.png",
+        "1000.png",
+        "1002.png",
+        None,
+    ]
+
+
+def test_shared_attachments_are_downloaded_once(mw: MockMainWindow) -> None:
+    from src.importers.noji import NojiDeck, NojiImporter, NojiPage  # noqa: PLC0415
+
+    with StandinServer(AccountSpec(cards=0, decks=1, media=1)) as server:
+        importer = NojiImporter(mw, token="token")  # type: ignore
+        deck = NojiDeck(id=1, anki_id=mw.col.decks.id("Deck"), name="Deck", card_count=0)  # type: ignore
+        pages = []
+        for offset in (0, 3):
+            # Each note gets a differently signed URL of the same attachment
+            note_dicts = {
+                str(note_id): {"fieldAttachmentUrls": {"1000": f"{server.url}/noji/media/1000.png?signature={note_id}"}}
+                for note_id in range(offset, offset + 3)
+            }
+            page = NojiPage(deck, offset, note_dicts, [], {})
+            importer._download_page_media(page)
+            pages.append(page)
+        try:
+            assert server.requests["noji/media/{id}"] == 1
+            assert list(pages[0].media) == [f"{server.url}/noji/media/1000.png"]
+            assert not pages[1].media
+        finally:
+            for page in pages:
+                page.discard_media()
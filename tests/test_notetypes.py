@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import pytest
+from anki.collection import Collection
+from anki.models import NotetypeDict
+
+pytest.importorskip("aqt")
+
+from src.importers.notetypes import NotetypeIndex  # noqa: E402
+
+
+def new_notetype(
+    col: Collection, name: str, fields: tuple[str, ...] = ("Front", "Back"), qfmt: str = "{{Front}}"
+) -> NotetypeDict:
+    notetype = col.models.new(name)
+    for field_name in fields:
+        col.models.add_field(notetype, col.models.new_field(field_name))
+    template = col.models.new_template("Card 1")
+    template["qfmt"] = qfmt
+    template["afmt"] = "{{FrontSide}}<hr id=answer>{{Back}}"
+    col.models.add_template(notetype, template)
+    return notetype
+
+
+def test_identical_notetypes_are_reused(col: Collection) -> None:
+    added = NotetypeIndex(col).get_or_add(new_notetype(col, "Imported"))
+    count = len(col.models.all_names_and_ids())
+    # Found by a later import, whatever its name
+    index = NotetypeIndex(col)
+    assert index.get_or_add(new_notetype(col, "Imported"))["id"] == added["id"]
+    assert index.get_or_add(new_notetype(col, "Renamed"))["id"] == added["id"]
+    assert len(col.models.all_names_and_ids()) == count
+
+
+def test_changed_notetypes_are_added(col: Collection) -> None:
+    index = NotetypeIndex(col)
+    added = index.get_or_add(new_notetype(col, "Imported"))
+    other_fields = index.get_or_add(new_notetype(col, "Imported", fields=("Front", "Back", "Extra")))
+    other_template = index.get_or_add(new_notetype(col, "Imported", qfmt="{{Front}}<br>{{Back}}"))
+    assert len({added["id"], other_fields["id"], other_template["id"]}) == 3
+    # Added notetypes are indexed too
+    assert index.get_or_add(new_notetype(col, "Imported", qfmt="{{Front}}<br>{{Back}}"))["id"] == other_template["id"]
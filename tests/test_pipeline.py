@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import itertools
+import threading
+from collections.abc import Iterator
+
+import pytest
+
+from src.importers.pipeline import ImportPipeline
+
+
+class Producer:
+    """Yield numbers, recording which ones were produced and whether the generator was cleaned up."""
+
+    def __init__(self, count: int | None = None, fail_at: int | None = None) -> None:
+        self.count = count
+        self.fail_at = fail_at
+        self.produced: list[int] = []
+        self.closed_in: threading.Thread | None = None
+
+    def __iter__(self) -> Iterator[int]:
+        try:
+            for i in itertools.count() if self.count is None else range(self.count):
+                if i == self.fail_at:
+                    raise ValueError(i)
+                self.produced.append(i)
+                yield i
+        finally:
+            self.closed_in = threading.current_thread()
+
+
+def test_records_are_consumed_in_order() -> None:
+    producer = Producer(count=10)
+    with ImportPipeline(producer, max_pending=2) as pipeline:
+        assert list(pipeline) == list(range(10))
+    assert producer.closed_in is not threading.current_thread()
+
+
+def test_producer_exception_reaches_consumer() -> None:
+    producer = Producer(count=10, fail_at=3)
+    consumed = []
+    with pytest.raises(ValueError, match="3"), ImportPipeline(producer, max_pending=2) as pipeline:
+        consumed.extend(pipeline)
+    assert consumed == [0, 1, 2]
+
+
+def test_consumer_exception_stops_producer() -> None:
+    # The producer never ends, and is blocked on the full queue when the consumer fails
+    producer = Producer()
+    discarded: list[int] = []
+    pipeline = ImportPipeline(producer, max_pending=1, discard=discarded.append)
+    with pytest.raises(RuntimeError), pipeline:
+        for record in pipeline:
+            if record == 2:
+                raise RuntimeError
+    assert not pipeline.thread.is_alive()
+    # Generators are closed in the producer thread
+    assert producer.closed_in is pipeline.thread
+    # Every record is either consumed or discarded
+    assert sorted(discarded) == producer.produced[3:]
+
+
+def test_close_discards_pending_records() -> None:
+    producer = Producer(count=100)
+    discarded: list[int] = []
+    pipeline = ImportPipeline(producer, max_pending=5, discard=discarded.append)
+    consumed = []
+    with pipeline:
+        for record in pipeline:
+            consumed.append(record)
+            if record == 10:
+                break
+    assert not pipeline.thread.is_alive()
+    assert pipeline.queue.empty()
+    assert consumed + sorted(discarded) == producer.produced
+    assert len(discarded) <= 5 + 1
+
+
+def test_close_sets_stop_event() -> None:
+    # The event of the producer's HTTP client, whose requests would then be canceled
+    stopped = threading.Event()
+    with ImportPipeline(Producer(), max_pending=1, stopped=stopped) as pipeline:
+        records = iter(pipeline)
+        assert next(records) == 0
+        assert not stopped.is_set()
+    assert stopped.is_set()
+    assert not pipeline.thread.is_alive()
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import pytest
+from anki.decks import DeckId
+from anki.notes import NoteId
+
+from tests.benchmarks.standin import AccountSpec, StandinServer
+from tests.fixtures import MockMainWindow
+
+
+def test_source_map_round_trip(mw: MockMainWindow) -> None:
+    from src.importers.sources import SourceMap  # noqa: PLC0415
+
+    note = mw.col.new_note(mw.col.models.by_name("Basic"))
+    mw.col.add_note(note, DeckId(1))
+    sources = SourceMap("Noji", mw.col)  # type: ignore
+    sources.set("kept", note.id, "fingerprint")
+    sources.set("deleted", NoteId(note.id + 1), "fingerprint")
+    sources.save()
+    # Notes deleted since they were imported are forgotten
+    assert SourceMap("Noji", mw.col).entries == {"kept": (note.id, "fingerprint")}  # type: ignore
+
+
+def test_writer_records_sources(mw: MockMainWindow) -> None:
+    from src.importers.sources import SourceMap  # noqa: PLC0415
+    from src.importers.writer import NoteWriter  # noqa: PLC0415
+
+    sources = SourceMap("Noji", mw.col)  # type: ignore
+    writer = NoteWriter(mw.col, batch_size=10, source_map=sources)  # type: ignore
+    note = mw.col.new_note(mw.col.models.by_name("Basic"))
+    writer.add(note, DeckId(1), "source", "fingerprint")
+    # Sources are recorded once their notes are saved and have IDs
+    assert sources.get("source") is None
+    writer.flush()
+    assert sources.get("source") == (note.id, "fingerprint")
+
+
+def test_incremental_reimport(mw: MockMainWindow, monkeypatch: pytest.MonkeyPatch) -> None:
+    from src.importers.noji import NojiImporter  # noqa: PLC0415
+
+    with StandinServer(AccountSpec(cards=20, decks=2, media=0)) as server:
+        monkeypatch.setattr(NojiImporter, "api_url", server.noji_api_url)
+        assert NojiImporter(mw, token="token", incremental=True).do_import() == 20  # type: ignore
+        # Unchanged notes are neither imported again nor updated
+        assert NojiImporter(mw, token="token", incremental=True).do_import() == 0  # type: ignore
+    assert mw.col.note_count() == 20
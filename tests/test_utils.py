@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+pytest.importorskip("aqt")
+
+from src.importers.utils import imap_ordered  # noqa: E402
+
+
+def test_imap_ordered_discards_results_computed_ahead() -> None:
+    computed: list[int] = []
+    discarded: list[int] = []
+    lock = threading.Lock()
+
+    def compute(item: int) -> int:
+        with lock:
+            computed.append(item)
+        return item
+
+    results = imap_ordered(compute, range(10), max_workers=3, discard=discarded.append)
+    assert [next(results), next(results)] == [0, 1]
+    results.close()
+    # Every result is either yielded or discarded
+    assert sorted(discarded) == sorted(set(computed) - {0, 1})
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from anki.collection import Collection
+from anki.decks import DeckId
+from anki.notes import Note
+
+from src.importers.writer import NoteWriter
+
+
+def new_note(col: Collection, front: str, guid: str) -> Note:
+    note = col.new_note(col.models.by_name("Basic"))
+    note["Front"] = front
+    note.guid = guid
+    return note
+
+
+def test_notes_are_added_in_batches(col: Collection) -> None:
+    flushes = []
+    writer = NoteWriter(col, batch_size=3, on_flush=lambda: flushes.append(col.note_count()))
+    for i in range(7):
+        writer.add(new_note(col, str(i), f"guid{i}"), DeckId(1))
+    assert flushes == [3, 6]
+    writer.flush()
+    assert flushes == [3, 6, 7]
+    assert writer.added_count == 7
+
+
+def test_notes_are_updated(col: Collection) -> None:
+    note = new_note(col, "before", "guid")
+    col.add_note(note, DeckId(1))
+    writer = NoteWriter(col, batch_size=10)
+    note["Front"] = "after"
+    writer.update(note)
+    writer.flush()
+    assert col.get_note(note.id)["Front"] == "after"
+    assert writer.updated_count == 1
+
+
+def test_colliding_guids_are_replaced(col: Collection) -> None:
+    col.add_note(new_note(col, "existing", "guid"), DeckId(1))
+    writer = NoteWriter(col, batch_size=10)
+    # Colliding with a note in the collection and with a pending note
+    first = new_note(col, "first", "guid")
+    second = new_note(col, "second", "other")
+    third = new_note(col, "third", "other")
+    for note in (first, second, third):
+        writer.add(note, DeckId(1))
+    writer.flush()
+    assert first.guid != "guid"
+    assert second.guid == "other"
+    assert third.guid not in ("guid", "other")
+    assert len(set(col.db.list("select guid from notes"))) == 4